@@ -1,134 +1,238 @@
+import os
 import sys
-import random
 import time
+from collections import OrderedDict
 import pygame
+from assets import assets
+from cube import CENTERED, OWNED, UNAVAILABLE
+from dicesource import RandomDice
+from engine import Position, entry_point, off_point
+from matchprocess import update_scoreboard
+from positionid import GAME_OVER, PLAYING, MatchState, decode_match_id, decode_position_id, match_id, position_id
+from record import RecordWriter
+from scheduler import Scheduler
 
-def update_scoreboard(filename: str, players: list[str], score: list[int]):
-    import csv
-    import os
-
-    players = list(players)
-    score = list(score)
-
-    if not os.path.exists(filename):
-        with open(filename, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([""] + players)
-            for p in players:
-                writer.writerow([p] + [""] * len(players))
-
-    with open(filename, 'r', newline='') as f:
-        reader = list(csv.reader(f))
-
-    if not reader or not reader[0]:
-        raise ValueError("CSV file is malformed or empty")
-
-    headers = reader[0]
-    rows_dict = {row[0]: row for row in reader[1:]}
-
-    for player in players:
-        if player not in headers:
-            headers.append(player)
-            for row in rows_dict.values():
-                row.append("")
-            new_row = [player] + [""] * (len(headers) - 1)
-            rows_dict[player] = new_row
-
-    full_rows = [headers]
-    for row_name in headers[1:]:
-        if row_name not in rows_dict:
-            rows_dict[row_name] = [row_name] + [""] * (len(headers) - 1)
-        else:
-            row = rows_dict[row_name]
-            if len(row) < len(headers):
-                row += [""] * (len(headers) - len(row))
-            rows_dict[row_name] = row
-        full_rows.append(rows_dict[row_name])
 
-    p1, p2 = players
-    i = headers.index(p1)
-    j = headers.index(p2)
+class HitIndex:
+    """
+    Which board point or checker the mouse is on, from geometry built once.
+
+    Each point keeps the mask of its triangle, drawn exactly as it is on
+    screen (the top half rotated 180°), and every screen column lists the
+    points and checker stacks that reach it, so a click tests a couple of
+    candidates instead of all 24 points.
 
-    cell_val = rows_dict[p1][j]
-    if cell_val:
-        try:
-            existing = eval(cell_val)
-            new_score = [int(existing[0]) + int(score[0]), int(existing[1]) + int(score[1])]
-        except Exception:
-            new_score = score
-    else:
-        new_score = score
+    Args:
+        width: screen width.
+        polygon: triangle points relative to its surface.
+        surface_size: (width, height) of the triangle's surface.
+        polygon_positions: screen position of each point's surface; points
+            12-23 are drawn rotated.
+        checker_size: (width, height) of a checker.
+        checker_positions: for each point, the screen position of its 1st,
+            2nd, ... checker.
+    """
 
-    rows_dict[p1][j] = str(new_score)
+    def __init__(self, width, polygon, surface_size, polygon_positions, checker_size, checker_positions):
+        self.width = width
+        self.surface_size = surface_size
+        self.polygon_positions = polygon_positions
+        surf = pygame.Surface(surface_size, pygame.SRCALPHA)
+        pygame.draw.polygon(surf, (255, 255, 255), polygon)
+        masks = (pygame.mask.from_surface(surf), pygame.mask.from_surface(pygame.transform.rotate(surf, 180)))
+        self.masks = [masks[i >= 12] for i in range(24)]
+        # rects as Game used to build them with pygame.Rect(*pos, *size)
+        self.checker_rects = [[tuple(pygame.Rect(*pos, *checker_size)) for pos in positions] for positions in checker_positions]
+
+        point_columns = [[] for _ in range(width)]
+        checker_columns = [[] for _ in range(width)]
+        for i, (x, _) in enumerate(polygon_positions):
+            # a click at column m reads the mask at m - x, or at width - (m - x) when rotated
+            for m in range(max(0, int(x) - 1), min(width, int(x) + surface_size[0] + 2)):
+                local = m - x if i < 12 else surface_size[0] - (m - x)
+                if 0 <= local < surface_size[0]:
+                    point_columns[m].append(i)
+        for i, rects in enumerate(self.checker_rects):
+            for m in range(max(0, rects[0][0]), min(width, rects[0][0] + rects[0][2])):
+                checker_columns[m].append(i)
+        self.point_columns = [tuple(points) for points in point_columns]
+        self.checker_columns = [tuple(points) for points in checker_columns]
+
+    def inside_point(self, i, pos):
+        """Whether pos is inside point i's triangle."""
+        x, y = self.polygon_positions[i]
+        local_x = pos[0] - x
+        local_y = pos[1] - y
+        if i >= 12:
+            local_x = self.surface_size[0] - local_x
+            local_y = self.surface_size[1] - local_y
+        if not (0 <= local_x < self.surface_size[0] and 0 <= local_y < self.surface_size[1]):
+            return False
+        return self.masks[i].get_at((int(local_x), int(local_y))) == 1
+
+    def points_at(self, pos):
+        """The points whose triangle contains pos, in index order."""
+        if not 0 <= pos[0] < self.width:
+            return ()
+        return [i for i in self.point_columns[pos[0]] if self.inside_point(i, pos)]
+
+    def checkers_at(self, pos, pieces):
+        """The points whose top checker (or empty first slot) is under pos, in index order."""
+        if not 0 <= pos[0] < self.width:
+            return ()
+        hits = []
+        for i in self.checker_columns[pos[0]]:
+            x, y, w, h = self.checker_rects[i][max(abs(pieces[i]), 1) - 1]
+            if y <= pos[1] < y + h:
+                hits.append(i)
+        return hits
+
+
+class SpriteAtlas:
+    """
+    Static overlay sprites packed side by side into one surface and drawn
+    with area blits, so frames never create surfaces for them.
 
-    with open(filename, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(headers)
-        for row_name in headers[1:]:
-            writer.writerow(rows_dict[row_name])
+    Args:
+        sprites: name -> per-pixel alpha surface, copied in exactly.
+    """
 
+    def __init__(self, sprites):
+        width = sum(sprite.get_width() for sprite in sprites.values())
+        height = max(sprite.get_height() for sprite in sprites.values())
+        self.surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.rects = {}
+        x = 0
+        for name, sprite in sprites.items():
+            # adding onto transparent pixels copies RGBA instead of blending
+            self.surface.blit(sprite, (x, 0), special_flags=pygame.BLEND_RGBA_ADD)
+            self.rects[name] = pygame.Rect(x, 0, *sprite.get_size())
+            x += sprite.get_width()
 
+    def blit(self, target, name, pos):
+        target.blit(self.surface, pos, self.rects[name])
 
 
-def point_inside_polygon(polygon, pos, surface_size, flip=False):
+class TextCache:
     """
-    Checks if the mouse is inside a polygon drawn onto a surface.
+    Rendered text surfaces, least recently used evicted first.
+
+    Text with an outline is composited once into a single surface with the
+    outline baked in, so drawing it is one blit instead of two font renders
+    and (2 * thickness + 1) ** 2 blits. Labels like the pip counts simply get
+    a new key when their value changes; the old surfaces age out.
 
     Args:
-        polygon: List of points relative to surface.
-        pos: Position on screen where the surface is rendered.
-        surface_size: (width, height) of the surface.
-        flip: Whether the surface was rotated 180° before rendering.
+        size: maximum number of surfaces kept.
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # every surface made here, font renders included
+        self.surfaces = 0
+
+    def get(self, text, font, text_color, outline_color=None, outline_thickness=0):
+        """The surface of text, outline included; it is drawn outline_thickness up and left of the text."""
+        key = (text, font, tuple(text_color), tuple(outline_color) if outline_color else None, outline_thickness)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        base = font.render(text, True, text_color)
+        self.surfaces += 1
+        if outline_thickness:
+            t = outline_thickness
+            outline = font.render(text, True, outline_color)
+            self.surfaces += 2
+            surface = pygame.Surface((base.get_width() + 2 * t, base.get_height() + 2 * t), pygame.SRCALPHA)
+            for dx in range(-t, t + 1):
+                for dy in range(-t, t + 1):
+                    if dx != 0 or dy != 0:
+                        surface.blit(outline, (t + dx, t + dy))
+            surface.blit(base, (t, t))
+        else:
+            surface = base
+        if len(self.entries) >= self.size:
+            self.entries.popitem(last=False)
+        self.entries[key] = surface
+        return surface
+
+    def clear(self):
+        self.entries.clear()
 
-    Returns:
-        True if mouse is inside polygon, False otherwise.
+
+text_cache = TextCache()
+
+
+class SurfaceCounter:
     """
-    try:
-        mouse_x, mouse_y = pygame.mouse.get_pos()
+    Counts the surfaces made inside a with block, wherever they come from.
 
-        # Create a temporary surface
-        surf = pygame.Surface(surface_size, pygame.SRCALPHA)
-        pygame.draw.polygon(surf, (255, 255, 255), polygon)
+    Only while the block runs, pygame.Surface is a counting subclass and a
+    profile hook counts calls of the pygame functions and methods that
+    return new surfaces (transform, image loading, copy, convert, font
+    renders). Outside it nothing is replaced, and other modules never see
+    the subclass.
+    """
 
-        # Apply flip if needed
-        if flip:
-            surf = pygame.transform.rotate(surf, 180)
+    METHODS = {'copy', 'subsurface', 'convert', 'convert_alpha', 'render'}
+    MODULES = {'pygame.transform', 'pygame.image'}
+    # functions in those modules that don't return a new surface
+    NOT_MADE = {'threshold', 'average_color', 'get_smoothscale_backend', 'set_smoothscale_backend',
+                'save', 'save_extended', 'tostring', 'tobytes', 'get_extended', 'get_sdl_image_version'}
 
-            # Adjust mouse position to rotated local coordinates
-            local_x = mouse_x - pos[0]
-            local_y = mouse_y - pos[1]
-            local_x = surface_size[0] - local_x
-            local_y = surface_size[1] - local_y
-        else:
-            local_x = mouse_x - pos[0]
-            local_y = mouse_y - pos[1]
+    def __init__(self):
+        self.count = 0
 
-        # Quick bounds check
-        if not (0 <= local_x < surface_size[0] and 0 <= local_y < surface_size[1]):
-            return False
+    def __enter__(self):
+        counter = self
 
-        # Create mask and test
-        mask = pygame.mask.from_surface(surf)
-        return mask.get_at((int(local_x), int(local_y))) == 1
+        class Surface(pygame.Surface):
+            def __init__(self, *args, **kwargs):
+                counter.count += 1
+                super().__init__(*args, **kwargs)
 
-    except Exception:
-        return False
+        self.surface = pygame.Surface
+        self.profile = sys.getprofile()
+        pygame.Surface = Surface
+        sys.setprofile(self.call)
+        return self
 
+    def __exit__(self, *exc):
+        sys.setprofile(self.profile)
+        pygame.Surface = self.surface
+
+    def call(self, frame, event, func):
+        if event == 'c_call':
+            owner = getattr(func, '__self__', None)
+            if isinstance(owner, (self.surface, pygame.font.Font)):
+                self.count += func.__name__ in self.METHODS
+            elif getattr(func, '__module__', None) in self.MODULES:
+                self.count += func.__name__ not in self.NOT_MADE
+        if self.profile is not None:
+            self.profile(frame, event, func)
 
 
 def draw_text_with_outline(surface, text, font, pos, text_color, outline_color, outline_thickness=1):
-    x, y = pos
-    base = font.render(text, True, text_color)
-    outline = font.render(text, True, outline_color)
+    text_surface = text_cache.get(text, font, text_color, outline_color, outline_thickness)
+    surface.blit(text_surface, (pos[0] - outline_thickness, pos[1] - outline_thickness))
 
-    for dx in range(-outline_thickness, outline_thickness + 1):
-        for dy in range(-outline_thickness, outline_thickness + 1):
-            if dx != 0 or dy != 0:
-                surface.blit(outline, (x + dx, y + dy))
+class Animation:
+    """
+    Frames picked by the time since the animation started, not by how many
+    frames were rendered, so it plays the same at any frame rate.
 
-    surface.blit(base, (x, y))
+    Args:
+        images: the frames.
+        img_dur: how long each frame shows, in 60ths of a second.
+        loop: start over after the last frame, else stay on it.
+    """
 
-class Animation:
     def __init__(self, images, img_dur=5, loop=True):
         self.images = images
         self.loop = loop
@@ -136,19 +240,28 @@ class Animation:
         self.done = False
         self.dur = len(self.images) * img_dur / 60
         self.frame = 0
-    
+        self.start = time.perf_counter()
+
     def remainin_dur(self):
-        return self.dur - (self.frame*self.img_duration/60)
+        return max(0.0, self.dur - (time.perf_counter() - self.start))
+
+    @property
+    def animating(self):
+        """Whether the image still changes over time."""
+        return len(self.images) > 1 and not self.done
 
     def copy(self):
         return Animation(self.images, self.img_duration, self.loop)
 
     def update(self):
+        # frame counts 60ths of a second, as img_duration does
+        frame = int((time.perf_counter() - self.start) * 60)
+        length = self.img_duration * len(self.images)
         if self.loop:
-            self.frame = (self.frame + 1) % (self.img_duration * len(self.images))
+            self.frame = frame % length
         else:
-            self.frame = min(self.frame + 1, self.img_duration * len(self.images) - 1)
-            if self.frame >= self.img_duration * len(self.images) - 1:
+            self.frame = min(frame, length - 1)
+            if self.frame >= length - 1:
                 self.done = True
 
     def img(self):
@@ -174,12 +287,12 @@ class Dice:
 
     def roll(self):
         if not self.rolled:
-            self.value = random.randint(1, 6)
+            self.value = self.game.dice_source.die()
             self.rolled = True
             self.set_anim('roll')
             if self.game.audio_on:
                 self.game.dice_sound.play()
-            self.game.functions_to_call.append((self.anim.dur+time.time(), lambda: self.set_anim(self.value)))
+            self.game.scheduler.call_later(self.anim.dur, lambda: self.set_anim(self.value))
     
     def reset(self):
         self.rolled = False
@@ -188,19 +301,40 @@ class Dice:
     def rect(self):
         return pygame.Rect(*self.pos, *self.size)
     
-    def render(self, screen):
+    def double_pos(self):
+        return (self.pos[0] + (self.size[0] + 10) * (-1 if self.color == 'white' else 1), self.pos[1])
+
+    def scene_op(self):
+        """Advance the animation and return the die's draw operation (see Game.scene)."""
         self.anim.update()
-        screen.blit(self.anim.img(), self.pos)
-        if self.value not in self.game.moves_left and self.game.current_player:
-            s = pygame.Surface([self.size[0] - 12, self.size[1] - 12])
-            s.set_alpha(125)
-            screen.blit(s, [self.pos[0] + 5, self.pos[1] + 5])
+        img = self.anim.img()
+        dimmed = self.value not in self.game.moves_left and bool(self.game.current_player)
+        rect = self.rect()
         if self.doubled:
-            screen.blit(self.anim.img(), (self.pos[0] + (self.size[0] + 10) * (-1 if self.color == 'white' else 1), self.pos[1]))
+            rect = rect.union(pygame.Rect(self.double_pos(), self.size))
+        return (tuple(rect), self.render, self.game.screen, img, dimmed, self.doubled)
+
+    def render(self, screen, img, dimmed, doubled):
+        screen.blit(img, self.pos)
+        if dimmed:
+            self.game.atlas.blit(screen, f"dim_{self.color}", (self.pos[0] + 5, self.pos[1] + 5))
+        if doubled:
+            screen.blit(img, self.double_pos())
 
 
 class Game:
-    def __init__(self, menu, player_names, points=5, score=[0,0], audio_on=True):
+    BOT_DELAY = 0.5
+    # frame rate cap while something moves; with nothing to do the loop
+    # sleeps in pygame.event.wait until input or the next timer
+    FPS = 60
+    IDLE_TIMEOUT = 1.0
+    # how often to check on a bot that is still searching
+    BOT_POLL = 0.02
+    # report frames that make surfaces (see SurfaceCounter)
+    DEBUG = bool(os.environ.get('BACKGAMMON_DEBUG'))
+
+    def __init__(self, menu, player_names, points=5, score=[0,0], audio_on=True, bot=None, dice_source=None, record_path='matches.bgr',
+                 scoreboard='scoreboard.csv'):
         # Initialize Pygame
         pygame.init()
 
@@ -210,6 +344,10 @@ class Game:
         self.POLYGON_COLOR = (0,0,125)
         self.menu = menu
         self.game_over = False
+        # scoreboard points of each player once the match is won; written to
+        # the scoreboard file unless that is None
+        self.scoreboard = scoreboard
+        self.result = None
         self.winner_decided = False
 
         # Colors
@@ -218,13 +356,21 @@ class Game:
         self.WHITE = (255, 255, 255)
         self.RED = (255, 0, 0)
         self.BLACK = (0, 0, 0)
-        self.pieces = [0 for i in range(24)]
-        self.piece_rects = [0 for i in range(24)]
+        self.position = Position()
         self.pos_value = {0: 2, 11: 5, 16: 3, 18: 5}
         self.turn = 0
         self.last_rolled = 0
         self.score = score
-        self.functions_to_call = []
+        # delayed calls: dice settling, clearing messages, the next round
+        self.scheduler = Scheduler()
+        self.text_timer = None
+        # every die of the match comes from here; the same seed replays the same dice
+        self.dice_source = dice_source if dice_source is not None else RandomDice(record=True)
+        # every roll, move and cube action goes to the match record file (see record.py)
+        self.recorder = None
+        if record_path is not None:
+            self.recorder = RecordWriter(record_path, player_names, points, getattr(self.dice_source, 'seed', None) or 0)
+            self.recorder.start_game(self.score)
 
         # Board dimensions
         self.BOARD_WIDTH = 600
@@ -237,10 +383,17 @@ class Game:
     
         self.PIECE_SIZE = 28
         self.audio_on = audio_on
-        self.click_sound = pygame.mixer.Sound('assets/button.wav')
-        self.dice_sound = pygame.mixer.Sound('assets/dice.wav')
+        self.click_sound = assets.sound('button.wav')
+        self.dice_sound = assets.sound('dice.wav')
         self.stakes = 1
         self.can_use_cube = [True, True]
+        self.cube_offered = False
+        self.cube_checked = None
+
+        # Computer player (bot.Bot) and the moves it still has to show
+        self.bot = bot
+        self.bot_moves = []
+        self.bot_next = 0
 
         # Dice dimensions
         self.DICE_SIZE = 50
@@ -254,26 +407,17 @@ class Game:
 
         # Assets dictionary (placeholders for now)
         self.assets = {
-            "board": pygame.transform.scale(pygame.image.load("assets/board.webp").convert(), self.screen.get_size()),
+            "board": assets.image("board.webp", alpha=False, size=self.screen.get_size()),
             "triangle": pygame.Surface((self.TRIANGLE_SIZE, self.TRIANGLE_SIZE)),
-            "pawn_white": pygame.image.load("assets/Stone_White.png").convert_alpha(),
-            "pawn_black": pygame.image.load("assets/Stone_Black.png").convert_alpha(),
+            "pawn_white": assets.image("Stone_White.png"),
+            "pawn_black": assets.image("Stone_Black.png"),
             "dice": pygame.Surface((self.DICE_SIZE, self.DICE_SIZE)),
-            'dice_white_1' : Animation([pygame.image.load('assets/digit-1-white.png').convert_alpha()]),
-            'dice_white_2' : Animation([pygame.image.load('assets/digit-2-white.png').convert_alpha()]),
-            'dice_white_3' : Animation([pygame.image.load('assets/digit-3-white.png').convert_alpha()]),
-            'dice_white_4' : Animation([pygame.image.load('assets/digit-4-white.png').convert_alpha()]),
-            'dice_white_5' : Animation([pygame.image.load('assets/digit-5-white.png').convert_alpha()]),
-            'dice_white_6' : Animation([pygame.image.load('assets/digit-6-white.png').convert_alpha()]),
-            'dice_black_1' : Animation([pygame.image.load('assets/digit-1-black.png').convert_alpha()]),
-            'dice_black_2' : Animation([pygame.image.load('assets/digit-2-black.png').convert_alpha()]),
-            'dice_black_3' : Animation([pygame.image.load('assets/digit-3-black.png').convert_alpha()]),
-            'dice_black_4' : Animation([pygame.image.load('assets/digit-4-black.png').convert_alpha()]),
-            'dice_black_5' : Animation([pygame.image.load('assets/digit-5-black.png').convert_alpha()]),
-            'dice_black_6' : Animation([pygame.image.load('assets/digit-6-black.png').convert_alpha()]),
-            'dice_black_roll' : Animation([pygame.image.load('assets/digit-6-black.png').convert_alpha(),pygame.image.load('assets/digit-5-black.png').convert_alpha(),pygame.image.load('assets/digit-4-black.png').convert_alpha(),pygame.image.load('assets/digit-3-black.png').convert_alpha(),pygame.image.load('assets/digit-2-black.png').convert_alpha(),pygame.image.load('assets/digit-1-black.png').convert_alpha()], img_dur=1),
-            'dice_white_roll' : Animation([pygame.image.load('assets/digit-6-white.png').convert_alpha(),pygame.image.load('assets/digit-5-white.png').convert_alpha(),pygame.image.load('assets/digit-4-white.png').convert_alpha(),pygame.image.load('assets/digit-3-white.png').convert_alpha(),pygame.image.load('assets/digit-2-white.png').convert_alpha(),pygame.image.load('assets/digit-1-white.png').convert_alpha()], img_dur=1),
         }
+        for color in ('white', 'black'):
+            digits = [assets.image(f'digit-{n}-{color}.png') for n in range(1, 7)]
+            for n, digit in enumerate(digits, 1):
+                self.assets[f'dice_{color}_{n}'] = Animation([digit])
+            self.assets[f'dice_{color}_roll'] = Animation(digits[::-1], img_dur=1)
         self.dices = [
             Dice(self, 'black', (360 - 60, 270)),
             Dice(self, 'white', (300 - 60, 270)),
@@ -284,143 +428,343 @@ class Game:
         self.polygons = [0 for i in range(24)]
         self.polygon_surface_size = (66, 252)
         self.set_polygons()
-        self.moves_left = [0 for i in range(4)]
-        self.pieces_removed = [0,0]
-        
-        
+        self.atlas = self.build_atlas()
+        # where each checker of a stack goes, and the mouse hit-testing built from it
+        self.checker_positions = [[tuple(self.get_pos(i, j * self.PIECE_SIZE * (1 if i > 11 else -1))) for j in range(15)] for i in range(24)]
+        self.hits = HitIndex(self.SCREEN_WIDTH, self.polygon, self.polygon_surface_size, self.polygons,
+                             self.assets['pawn_white'].get_size(), self.checker_positions)
+        # draw operations on screen, see scene() and render()
+        self.last_scene = None
+
         # Game state
-        self.current_player = 0
         self.rolled = False
         self.piece_chosen = None
         self.initialize_board()
 
         # UI elements
-        self.font = pygame.font.Font('assets/font.otf', 26)
+        self.font = assets.font('font.otf', 26)
 
     def initialize_board(self):
         """
         Initialize the board state.
-        Each point on the board is represented by a list of pawns.
+        The rules and checker layout live in self.position (see engine.py).
         """
-        # self.pieces = [x+y for x,y in zip([self.pos_value.get(i, 0) for i in range(24)], [-self.pos_value.get(23-i, 0) for i in range(24)])]
-        self.pieces = [-2, 0, 0, 0, 0, 5, 0, 3, 0, 0, 0, -5, 5, 0, 0, 0, -3, 0, -5, 0, 0, 0, 0, 2]
-        # self.pieces = [2, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, -2]
-        # self.pieces_removed = [13, 13]
-        
-   
+        self.position.reset()
+
+    @property
+    def pieces(self):
+        return self.position.pieces
+
+    @property
+    def pieces_removed(self):
+        return self.position.pieces_removed
+
+    @property
+    def current_player(self):
+        return self.position.current_player
+
+    @current_player.setter
+    def current_player(self, player):
+        self.position.current_player = player
+
+    @property
+    def moves_left(self):
+        return self.position.moves_left
+
+    @moves_left.setter
+    def moves_left(self, moves):
+        self.position.moves_left = moves
+
     def reset_game(self):
-        self.pieces_removed = [0, 0]
         self.initialize_board()
         for dice in self.dices:
             dice.reset()
         self.turn = 0
         self.rolled = False
         self.winner_decided = False
-        self.moves_left = [0, 0, 0, 0]
-        self.current_player = 0
+        self.bot_moves = []
+        self.stakes = 1
+        self.can_use_cube = [True, True]
+        self.cube_offered = False
+        self.cube_checked = None
+        if self.bot is not None:
+            self.bot.forget()
+        if self.recorder is not None:
+            self.recorder.start_game(self.score)
+
+    def position_id(self):
+        """GNU Backgammon Position ID of the board, see positionid.py."""
+        return position_id(self.position.board(), self.current_player or 1)
+
+    def match_id(self):
+        """GNU Backgammon Match ID of the score, cube and dice."""
+        owner = 0 if all(self.can_use_cube) else (1 if self.can_use_cube[0] else -1)
+        return match_id(MatchState(
+            self.current_player or 1,
+            (self.dices[0].value, self.dices[1].value) if self.rolled else (0, 0),
+            self.score, self.points_to_win, self.stakes, owner,
+            state=GAME_OVER if self.winner_decided else PLAYING,
+            turn=-self.current_player if self.cube_offered else None,
+            double_offered=self.cube_offered))
+
+    def set_position(self, position_id, match_id=None):
+        """
+        Set the game up from a Position ID and optionally a Match ID; without
+        one white is on roll before rolling.
+
+        Raises:
+            ValueError: if an ID is invalid.
+        """
+        state = decode_match_id(match_id) if match_id else MatchState(1)
+        self.position = Position.from_board(decode_position_id(position_id, state.player), state.player)
+        for dice in self.dices:
+            dice.reset()
+        self.turn = 1
+        self.rolled = state.dice != (0, 0)
+        if self.rolled:
+            for dice, value in zip(self.dices, state.dice):
+                dice.value = value
+                dice.rolled = True
+                dice.set_anim(value)
+                dice.doubled = state.dice[0] == state.dice[1]
+            self.position.set_dice(*state.dice)
+        if match_id:
+            self.score = list(state.score)
+            self.points_to_win = state.length or self.points_to_win
+            self.stakes = state.cube
+            self.can_use_cube = [state.owner != -1, state.owner != 1]
+            self.cube_offered = state.double_offered
+        self.winner_decided = False
+        self.piece_chosen = None
+        self.bot_moves = []
+        if self.bot is not None:
+            self.bot.forget()
+        if self.recorder is not None:
+            # records replay from the opening position, this game can't be one
+            self.recorder.close()
+            self.recorder = None
 
     def get_points_to_give(self, player):
-        if self.get_player_pieces(player) == 0 and self.pieces_removed[player == -1] == 15 and not self.current_text in [f"{self.player_names[player == -1]} wins the game!", f"{self.player_names[player == -1]} wins this round!"]:
-            if (self.get_furthest_piece(player*-1) > 17 or self.player_has_dead_pieces(player*-1)) and self.pieces_removed[player*-1 == -1] == 0:return 3
-            elif self.pieces_removed[player*-1 == -1] == 0:return 2
-            else:return 1
+        if not self.current_text in [f"{self.player_names[player == -1]} wins the game!", f"{self.player_names[player == -1]} wins this round!"]:
+            return self.position.get_points_to_give(player) * self.stakes
+
     def can_remove_pieces(self, player):
-        s = 0
-        for i in range(*((0,6) if player == 1 else (18,24))):
-            if self.pieces[i] * player > 0:
-                s += abs(self.pieces[i])
-        return s + self.pieces_removed[player == -1] == 15
-                
-    
+        return self.position.can_remove_pieces(player)
+
     def legal_moves(self, piece):
-        # piece_is_dead is False when the piece moving is a piece on the board ow it refers to the player that owns the piece
-        piece_is_dead = self.player_has_dead_pieces(self.current_player)
-        if piece_is_dead and not piece in [24, -1]:return []
-        moves = []
-        for val in self.moves_left:
-            if val == 0:continue
-            val = (val * (1 if self.current_player < 0 else -1))
-            ind = piece + val
-            if ind < 0 or ind > 23:
-                if self.can_remove_pieces(self.current_player):
-                    moves.append(val)
-                continue
-            if (self.current_player * self.pieces[ind] > 0) or self.pieces[ind] == 0:
-                moves.append(val)
-            elif abs(self.pieces[ind]) == 1:
-                moves.append(val)
-        # print(self.pieces[piece])
-        return moves
-    
+        return self.position.legal_moves(piece)
+
     def get_player_pieces(self, player):
         """
         Get the pieces of the specified player.
         """
-        return abs(sum([piece for piece in (self.pieces) if piece * player > 0]))
+        return self.position.get_player_pieces(player)
 
     def player_has_dead_pieces(self, player):
-        return self.get_player_pieces(player) + self.pieces_removed[self.current_player == -1] != 15
-    
+        return self.position.player_has_dead_pieces(player)
+
     def get_player_piece_positions(self, player):
-        return [i for i, piece in enumerate(self.pieces) if piece * player > 0]
+        return self.position.get_player_piece_positions(player)
 
     def get_furthest_piece(self, player):
-        positions = self.get_player_piece_positions(player)
-        if not positions:
-            return None
-        return max(positions) if player == 1 else min(positions)
-    
+        return self.position.get_furthest_piece(player)
+
     def play_move(self, piece, move):
-        # lines below used for debugging 
-        # print(self.current_player)
-        # print(piece, move)
-        # print(self.legal_moves(piece))
-        if move not in [piece + move for move in self.legal_moves(piece)] and not self.can_remove_pieces(self.current_player):
+        if not self.position.play_move(piece, move):
             return False
-        if self.player_has_dead_pieces(self.current_player):
-            if self.pieces[move] == 0 or self.pieces[move] * self.current_player < 0:
-                self.pieces[move] = self.current_player
-                self.moves_left.remove(abs(piece-move))
-                return True
-            if self.pieces[move] * self.current_player > 0:
-                self.pieces[move] += self.current_player
-                self.moves_left.remove(abs(piece-move))
-                return True
-            else:
-                return False
-        if self.can_remove_pieces(self.current_player):
-            if (move == 24 if self.current_player == -1 else move == -1) and move in [piece + move for move in self.legal_moves(piece)]:
-                self.pieces_removed[self.current_player == -1] += 1
-                self.pieces[piece] -= self.current_player
-                self.moves_left.remove(abs(piece-move))
-                return True
-            else:
-                if move <= -1 and sum([-1 in moves for moves in [self.legal_moves(i) for i in self.get_player_piece_positions(self.current_player)]]) == 0 and piece == self.get_furthest_piece(self.current_player):
-                    self.pieces_removed[self.current_player == -1] += 1
-                    self.pieces[piece] -= self.current_player
-                    self.moves_left.remove(min([val for val in self.moves_left if val]))
-                    return True
-                if move >= 24 and sum([24 in moves for moves in [self.legal_moves(i) for i in self.get_player_piece_positions(self.current_player)]]) == 0 and piece == self.get_furthest_piece(self.current_player):
-                    self.pieces_removed[self.current_player == -1] += 1
-                    self.moves_left.remove(min([val for val in self.moves_left if val]))
-                    self.pieces[piece] -= self.current_player
-                    return True
-        if self.current_player * self.pieces[move] > 0:
-            self.pieces[piece] = self.pieces[piece] - 1 if self.pieces[piece] > 0 else self.pieces[piece] + 1 if self.pieces[piece] < 0 else 0
-            self.pieces[move] = self.pieces[move] + 1 if self.pieces[move] > 0 else self.pieces[move] - 1 if self.pieces[move] < 0 else 0
-            self.moves_left.remove(abs(piece-move))
-            return True
-        elif (self.pieces[move] * self.current_player < 0 and abs(self.pieces[move]) == 1):
-            self.pieces[move] = 1 if self.pieces[piece] > 0 else -1
-            self.pieces[piece] = self.pieces[piece] - 1 if self.pieces[piece] > 0 else self.pieces[piece] + 1 if self.pieces[piece] < 0 else 0
-            self.moves_left.remove(abs(piece-move))
-            return True
-        elif self.pieces[move] == 0:
-            self.pieces[move] = 1 if self.pieces[piece] > 0 else -1
-            self.pieces[piece] = self.pieces[piece] - 1 if self.pieces[piece] > 0 else self.pieces[piece] + 1 if self.pieces[piece] < 0 else 0
-            self.moves_left.remove(abs(piece-move))
+        if self.recorder is not None:
+            self.recorder.move(piece, move)
+        return True
+
+    def record_roll(self):
+        if self.recorder is not None:
+            self.recorder.roll(self.current_player, self.dices[0].value, self.dices[1].value)
+
+    def end_turn(self):
+        for dice in self.dices:
+            dice.reset()
+        self.rolled = False
+        self.turn += 1
+        self.current_player = -1 if self.current_player == 1 else 1
+        self.piece_chosen = None
+        self.bot_next = time.time() + self.BOT_DELAY
+
+    def finish_round(self, player, points):
+        # the round is scored once, however often the end is noticed
+        if self.winner_decided or self.game_over:
+            return
+        if self.recorder is not None:
+            self.recorder.end_game(player, points)
+        self.score[player == -1] += points
+        self.winner_decided = True
+        if self.score[player == -1] >= (self.points_to_win):
+            self.show_text(f"{self.player_names[player == -1]} wins the game!", None)
+            self.scheduler.call_later(4, lambda: (setattr(self, 'game_over', True), self.show_text('', None)))
+            self.result = [max(0, score-(max(self.score)-1)) for score in self.score]
+            if self.scoreboard is not None:
+                update_scoreboard(self.scoreboard, self.player_names, self.result)
+        else:
+            # the message stays up until the next round starts: run() reads it to see the round is over
+            self.show_text(f"{self.player_names[player == -1]} wins this round!", None)
+            self.scheduler.call_later(4, lambda: (self.show_text('', None), self.reset_game()))
+
+    def show_text(self, text, duration=4):
+        """
+        Show a message across the board in place of the current one.
+
+        Args:
+            text: the message, '' for none.
+            duration: seconds before it is cleared, None to leave it up.
+        """
+        if self.text_timer is not None:
+            self.text_timer.cancel()
+            self.text_timer = None
+        self.current_text = text
+        if duration is not None:
+            self.text_timer = self.scheduler.call_later(duration, lambda: self.show_text('', None))
+
+    def cube_owner(self, player):
+        """Who holds the cube as seen by player (see cube.py)."""
+        if all(self.can_use_cube):
+            return CENTERED
+        return OWNED if self.can_use_cube[player == -1] else UNAVAILABLE
+
+    def can_double(self):
+        """The player on roll may still double before rolling this turn."""
+        return (self.turn > 0 and not self.rolled and not any(dice.rolled for dice in self.dices)
+                and self.can_use_cube[self.current_player == -1] and not self.cube_offered
+                and not self.winner_decided and not self.game_over and self.stakes < 64)
+
+    def offer_double(self):
+        self.cube_offered = True
+        if self.recorder is not None:
+            self.recorder.double()
+        self.show_text(f"{self.player_names[self.current_player == -1]} doubles!", None)
+
+    def take_double(self):
+        taker = -self.current_player
+        self.stakes *= 2
+        self.can_use_cube = [taker == 1, taker == -1]
+        self.cube_offered = False
+        self.show_text('', None)
+        if self.recorder is not None:
+            self.recorder.take()
+
+    def drop_double(self):
+        self.cube_offered = False
+        if self.recorder is not None:
+            self.recorder.drop()
+        self.finish_round(self.current_player, self.stakes)
+
+    def humans_turn(self):
+        """Whether the mouse may act: the bot neither moves nor has to answer a double."""
+        if self.bot is None:
             return True
-    
+        if self.cube_offered:
+            return self.current_player == self.bot.player
+        return self.current_player != self.bot.player
+
+    def bot_to_act(self):
+        """Whether update_bot() has something to do, now or once bot_next passes."""
+        if self.bot is None or self.game_over or self.winner_decided:
+            return False
+        if self.turn == 0 and not self.rolled:
+            return not self.dices[self.bot.player == 1].rolled
+        if self.cube_offered:
+            return self.current_player != self.bot.player
+        return self.current_player == self.bot.player
+
+    def animating(self):
+        return any(dice.anim.animating for dice in self.dices)
+
+    def next_wakeup(self):
+        """Seconds until a timer or the bot is due, at most IDLE_TIMEOUT."""
+        now = time.time()
+        due = [self.IDLE_TIMEOUT]
+        delay = self.scheduler.next_delay()
+        if delay is not None:
+            due.append(delay)
+        if self.bot_to_act():
+            due.append(self.BOT_POLL if self.bot.thinking else self.bot_next - now)
+        return max(0, min(due))
+
+    def wait_events(self, timeout):
+        """The pending events, first sleeping up to timeout seconds for one if there are none."""
+        if timeout <= 0:
+            return pygame.event.get()
+        event = pygame.event.wait(int(timeout * 1000) + 1)
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event] + pygame.event.get()
+
+    def update_bot(self):
+        """
+        Roll, think and move for the computer player. Called once per frame;
+        the search runs in the bot's worker process, so this never blocks.
+        """
+        now = time.time()
+        if self.bot is None or self.game_over or self.winner_decided or now < self.bot_next:
+            return
+        if self.turn == 0 and not self.rolled:
+            # opening roll: each side rolls their own die
+            dice = self.dices[self.bot.player == 1]
+            if not dice.rolled:
+                dice.roll()
+            return
+        if self.cube_offered:
+            # the human doubled, the bot answers
+            if self.current_player != self.bot.player:
+                answer = self.bot.poll()
+                if answer is None:
+                    if not self.bot.thinking:
+                        self.bot.start_take(self.position.board(), self.cube_owner(self.current_player))
+                elif answer:
+                    self.take_double()
+                else:
+                    self.drop_double()
+            return
+        if self.current_player != self.bot.player:
+            return
+        if not self.rolled:
+            if self.can_double() and self.cube_checked != self.turn:
+                answer = self.bot.poll()
+                if answer is None:
+                    if not self.bot.thinking:
+                        self.bot.start_double(self.position.board(), self.cube_owner(self.bot.player))
+                    return
+                self.cube_checked = self.turn
+                if answer:
+                    self.offer_double()
+                    return
+            if not self.dices[0].rolled and not self.dices[1].rolled:
+                self.dices[0].roll()
+                self.dices[1].roll()
+                self.bot_next = now + self.dices[0].anim.dur + self.BOT_DELAY
+            return
+        if self.bot_moves:
+            # show which checker moves, then move it on the next step
+            piece, move = self.bot_moves[0]
+            if self.piece_chosen != piece:
+                self.piece_chosen = piece
+            else:
+                self.bot_moves.pop(0)
+                if self.play_move(piece, move) and self.audio_on:
+                    self.click_sound.play()
+                self.piece_chosen = None
+                if not self.bot_moves:
+                    self.end_turn()
+            self.bot_next = now + self.BOT_DELAY
+            return
+        if self.bot.thinking:
+            return
+        moves = self.bot.poll()
+        if moves is None:
+            self.bot.start(self.position.board(), self.dices[0].value, self.dices[1].value)
+        elif moves:
+            self.bot_moves = moves
+        else:
+            self.end_turn()
+
     def set_polygons(self):
         for move in range(24):
             if move < 12:
@@ -435,125 +779,185 @@ class Game:
         return pos
 
 
-    def render(self):
+    def scene(self):
         """
-        Render the game board, pawns, dice, and UI.
+        What the frame shows, as draw operations (rect, function, *args) in
+        drawing order over the board image. Equal operations draw the same
+        pixels inside their rect, so comparing two scenes tells which parts of
+        the screen changed.
         """
-        # Draw the board
-        self.screen.blit(self.assets["board"], (0,0))
-        highlight = pygame.Surface(self.polygon_surface_size)
-        highlight.set_colorkey((0,0,0))
-        pygame.draw.polygon(highlight, self.POLYGON_COLOR, self.polygon)        
-        highlight.set_alpha(125)
-
+        screen = self.screen
+        ops = []
         if isinstance(self.piece_chosen, int):
-            for move in [self.piece_chosen+ move for move in self.legal_moves(self.piece_chosen)]:
-                try:
-                    if 0 <= move < 12:
-                        self.screen.blit(highlight, self.polygons[move])
-                    elif 12<= move <=23:
-                        self.screen.blit(pygame.transform.rotate(highlight, 180), self.polygons[move])
-                except IndexError:
-                    print(f"Error: move {move} is out of bounds for polygons list.")
-                
-                
-
-        # Draw triangles and pawn s
+            for move in [self.piece_chosen + move for move in self.legal_moves(self.piece_chosen)]:
+                if 0 <= move <= 23:
+                    pos = tuple(self.polygons[move])
+                    ops.append(((*pos, *self.polygon_surface_size), self.atlas.blit, screen,
+                                'highlight_top' if move >= 12 else 'highlight', pos))
+
         for i, piece in enumerate(self.pieces):
-            y_dis = 0
-            pos = self.get_pos(i, y_dis)
-            self.piece_rects[i] = pygame.Rect(*pos, *self.assets['pawn_white'].get_size())
-            if piece != 0:
-                for j in range(abs(piece)):
-                    if y_dis != 0 :
-                        pos = self.get_pos(i, y_dis)
-                        self.piece_rects[i] = pygame.Rect(*pos, *self.assets['pawn_white'].get_size())
-                    color = self.assets["pawn_white"] if piece > 0 else self.assets["pawn_black"]
-                    # debug
-                    # pygame.draw.rect(self.screen, (0,255,0), self.piece_rects[i], 2)
-                    # self.screen.blit(self.font.render(str(i), True, (self.BLACK)), pos)
-                    self.screen.blit(color, pos)
-                    if j+1 == abs(piece) and not isinstance(self.piece_chosen, int):
-                        if (self.current_player > 0 and piece > 0) or (self.current_player < 0 and piece < 0):
-                            if self.legal_moves(i):
-                                pygame.draw.circle(self.screen, [102, 255,0], [pos[0] + 12, pos[1] + 12], 5)
-                    y_dis += self.PIECE_SIZE * (1 if i > 11 else -1)
+            image = self.assets["pawn_white"] if piece > 0 else self.assets["pawn_black"]
+            for j in range(abs(piece)):
+                pos = self.checker_positions[i][j]
+                ops.append((self.hits.checker_rects[i][j], screen.blit, image, pos))
+                if j+1 == abs(piece) and not isinstance(self.piece_chosen, int):
+                    if (self.current_player > 0 and piece > 0) or (self.current_player < 0 and piece < 0):
+                        if self.legal_moves(i):
+                            center = (pos[0] + 12, pos[1] + 12)
+                            ops.append(((center[0] - 5, center[1] - 5, 11, 11), self.atlas.blit, screen, 'dot', (center[0] - 5, center[1] - 5)))
+        size = self.assets['pawn_white'].get_size()
         for i in [-1, 1]:
-            if self.player_has_dead_pieces(i):
-                for j in range(15- self.get_player_pieces(i) - self.pieces_removed[i == -1]):
-                    pos = [575, (15 + j * self.PIECE_SIZE) if i > 0 else (560 - j *self.PIECE_SIZE)]
-                    self.screen.blit(self.assets["pawn_white"] if i > 0 else self.assets["pawn_black"], pos)
-                    if i == self.current_player and j == 15 - self.get_player_pieces(i) - 1 and self.rolled:
-                        pygame.draw.circle(self.screen, [102, 255,0], [pos[0] + 12, pos[1] + 12], 5)
+            for j in range(self.position.bar[i == -1]):
+                pos = (575, (15 + j * self.PIECE_SIZE) if i > 0 else (560 - j *self.PIECE_SIZE))
+                ops.append(((*pos, *size), screen.blit, self.assets["pawn_white"] if i > 0 else self.assets["pawn_black"], pos))
+                if i == self.current_player and j == self.position.bar[i == -1] - 1 and self.rolled:
+                    center = (pos[0] + 12, pos[1] + 12)
+                    ops.append(((center[0] - 5, center[1] - 5, 11, 11), self.atlas.blit, screen, 'dot', (center[0] - 5, center[1] - 5)))
 
         for dice in self.dices:
-            dice.render(self.screen)
+            ops.append(dice.scene_op())
 
         if self.can_remove_pieces(self.current_player) and self.rolled and isinstance(self.piece_chosen, int):
-            s = pygame.Surface(self.bear_rect().size)
-            s.fill(self.POLYGON_COLOR)
-            s.set_alpha(125)
-            self.screen.blit(s, self.bear_rect().topleft)
-        # Draw UI elements
-        self.draw_ui()
-
-        pygame.display.flip()
-    
+            rect = tuple(self.bear_rect())
+            ops.append((rect, self.atlas.blit, screen, 'bear_off', rect[:2]))
+
+        rect = self.cube_rect()
+        ops.append((tuple(rect.inflate(12, 12)), self.draw_cube, tuple(rect), str(self.stakes if self.stakes > 1 else 64),
+                    self.can_double() and self.humans_turn()))
+        if self.cube_offered:
+            for rect, label, color in ((self.take_rect(), "Take", self.GREEN), (self.drop_rect(), "Drop", self.RED)):
+                ops.append((tuple(rect), self.draw_button, tuple(rect), label, color))
+
+        texts = [*self.player_names[::-1], f"PIP: {self.get_pip(-1)}", f"PIp: {self.get_pip(1)}", f'S:{self.score[1]}/{self.points_to_win}', f'S:{self.score[0]}/{self.points_to_win}']
+        positions = [(20, 2), (20, 574), (self.SCREEN_WIDTH - 140, 2), (self.SCREEN_WIDTH - 140, 574), (self.SCREEN_WIDTH - 340, 2), (self.SCREEN_WIDTH - 340, 574)]
+        if self.current_text:
+            texts.append(self.current_text)
+            positions.append((self.SCREEN_WIDTH // 2 - self.font.size(self.current_text)[0] // 2, 220))
+        for text, pos in zip(texts, positions):
+            width, height = self.font.size(text)
+            ops.append(((pos[0] - 2, pos[1] - 2, width + 4, height + 4), draw_text_with_outline,
+                        screen, text, self.font, pos, self.WHITE, self.BLACK, 2))
+        return ops
+
+    def build_atlas(self):
+        """Pre-draw the translucent overlays: point highlights, dimmed dice, the bear-off zone and move dots."""
+        highlight = pygame.Surface(self.polygon_surface_size, pygame.SRCALPHA)
+        pygame.draw.polygon(highlight, (*self.POLYGON_COLOR, 125), self.polygon)
+        sprites = {'highlight': highlight, 'highlight_top': pygame.transform.rotate(highlight, 180)}
+        for dice in self.dices:
+            sprites[f'dim_{dice.color}'] = pygame.Surface((dice.size[0] - 12, dice.size[1] - 12), pygame.SRCALPHA)
+            sprites[f'dim_{dice.color}'].fill((0, 0, 0, 125))
+        sprites['bear_off'] = pygame.Surface(self.bear_rect().size, pygame.SRCALPHA)
+        sprites['bear_off'].fill((*self.POLYGON_COLOR, 125))
+        sprites['dot'] = pygame.Surface((11, 11), pygame.SRCALPHA)
+        pygame.draw.circle(sprites['dot'], (102, 255, 0), (5, 5), 5)
+        return SpriteAtlas(sprites)
+
+    def invalidate(self):
+        """Redraw the whole window on the next frame."""
+        self.last_scene = None
+
+    def render(self):
+        """
+        Draw the parts of the screen whose draw operations changed since the
+        last frame, and update only those on the display. Every operation
+        overlapping a changed rect is drawn again in order, clipped to it, so
+        layering stays right.
+        Returns whether anything was drawn.
+        """
+        if not self.DEBUG:
+            return self.draw_scene()
+        cached = text_cache.surfaces, assets.surfaces
+        with SurfaceCounter() as made:
+            drawn = self.draw_scene()
+        if made.count:
+            print(f'render: {made.count} surfaces allocated (text cache {text_cache.surfaces - cached[0]}, '
+                  f'assets {assets.surfaces - cached[1]})')
+        return drawn
+
+    def draw_scene(self):
+        scene = self.scene()
+        if self.last_scene is None:
+            dirty = [self.screen.get_rect()]
+        else:
+            changed = set(self.last_scene).symmetric_difference(scene)
+            dirty = []
+            for op in changed:
+                rect = pygame.Rect(op[0]).inflate(2, 2)
+                index = rect.collidelist(dirty)
+                while index != -1:
+                    rect.union_ip(dirty.pop(index))
+                    index = rect.collidelist(dirty)
+                dirty.append(rect)
+        self.last_scene = scene
+        if not dirty:
+            return False
+        screen = self.screen
+        for rect in dirty:
+            screen.set_clip(rect)
+            screen.blit(self.assets["board"], rect, rect)
+            for op in scene:
+                if rect.colliderect(op[0]):
+                    op[1](*op[2:])
+        screen.set_clip(None)
+        pygame.display.update(dirty)
+        return True
+
     def bear_rect(self):
         return pygame.Rect(570, 330 if self.current_player == 1 else 20, 30, 240)
     
     def get_pip(self, player):
-        def calculate_pip(board, player=1):
-            pip = 0
-            for i, val in enumerate(board):
-                if player == 1 and val > 0:
-                    pip += abs(val * (i + 1))
-                elif player == -1 and val < 0:
-                    pip += abs(val) * (24 - i)
-            pip += abs(15- self.get_player_pieces(player) - self.pieces_removed[player == -1]) * 24
-            return pip
-        return calculate_pip(self.pieces, player)
-        return sum([abs(piece) * abs((i+1) - 23 if self.current_player == -1 else 0) for i, piece in enumerate(self.pieces) if piece * player > 0])
-
-    def draw_ui(self):
-        texts = [*self.player_names[::-1], f"PIP: {self.get_pip(-1)}", f"PIp: {self.get_pip(1)}", f'S:{self.score[1]}/{self.points_to_win}', f'S:{self.score[0]}/{self.points_to_win}']
-        positions = [[20, 2], [20, 574], [self.SCREEN_WIDTH - 140, 2], [self.SCREEN_WIDTH - 140, 574], [self.SCREEN_WIDTH - 340, 2], [self.SCREEN_WIDTH - 340, 574]]
-        for i, t in enumerate(texts):
-            text = self.font.render(t, True, self.WHITE)
-            draw_text_with_outline(self.screen, t, self.font, positions[i], self.WHITE, self.BLACK, outline_thickness=2)
-        text = self.font.render(self.current_text, True, self.WHITE)
-        draw_text_with_outline(self.screen, self.current_text, self.font, (self.SCREEN_WIDTH // 2 - text.get_width() // 2, 220), self.WHITE, self.BLACK, outline_thickness=2)
+        return self.position.get_pip(player)
+
+    def cube_rect(self):
+        # centred between the halves, or on the owner's side of the board
+        owner = 0 if all(self.can_use_cube) else (1 if self.can_use_cube[0] else -1)
+        return pygame.Rect(2, 283 + owner * 100, 34, 34)
+
+    def take_rect(self):
+        return pygame.Rect(190, 330, 100, 40)
+
+    def drop_rect(self):
+        return pygame.Rect(310, 330, 100, 40)
+
+    def draw_cube(self, rect, label, marker):
+        rect = pygame.Rect(rect)
+        pygame.draw.rect(self.screen, self.WHITE, rect, border_radius=5)
+        pygame.draw.rect(self.screen, self.BLACK, rect, 2, border_radius=5)
+        text = text_cache.get(label, self.font, self.BLACK)
+        self.screen.blit(text, text.get_rect(center=rect.center))
+        if marker:
+            pygame.draw.circle(self.screen, [102, 255,0], rect.topright, 5)
+
+    def draw_button(self, rect, label, color):
+        rect = pygame.Rect(rect)
+        pygame.draw.rect(self.screen, color, rect, border_radius=5)
+        width, height = self.font.size(label)
+        draw_text_with_outline(self.screen, label, self.font, (rect.centerx - width // 2, rect.centery - height // 2), self.WHITE, self.BLACK, outline_thickness=2)
 
 
     def run(self):
         """
         Main game loop.
         """
-        clock = pygame.time.Clock()
         running = True
+        timeout = 0
         while not self.game_over and running:
-            for time_to_call, func in self.functions_to_call:
-                if time.time()> time_to_call:
-                    func()
-                    self.functions_to_call.remove((time_to_call, func))
+            events = self.wait_events(timeout)
+            frame_start = time.perf_counter()
+            busy = bool(events)
+            if self.scheduler.run_due():
+                busy = True
             for player in [-1, 1]:
+                if self.winner_decided or self.game_over:
+                    break
                 if self.get_player_pieces(player) == 0 and self.pieces_removed[player == -1] == 15 and not self.current_text in [f"{self.player_names[player == -1]} wins the game!", f"{self.player_names[player == -1]} wins this round!"]:
-                    self.score[player == -1] += self.get_points_to_give(player) * self.stakes
-                    self.winner_decided = True
-                    if self.score[player == -1] >= (self.points_to_win):
-                        self.current_text = f"{self.player_names[player == -1]} wins the game!"
-                        self.functions_to_call.append((4+time.time(), lambda: (setattr(self, 'game_over', True), setattr(self, 'current_text', ''))))
-                        update_scoreboard('scoreboard.csv', self.player_names, [max(0, score-(max(self.score)-1)) for score in self.score])
-                    else:
-                        self.current_text = f"{self.player_names[player == -1]} wins this round!"
-                        self.functions_to_call.append((4+time.time(), lambda: (setattr(self, 'current_text', ''), self.reset_game())))
-                        continue
+                    self.finish_round(player, self.get_points_to_give(player))
 
             if self.player_has_dead_pieces(self.current_player) and self.current_player and self.rolled and not self.game_over:
-                self.piece_chosen = 24 if self.current_player == 1 else -1
+                self.piece_chosen = entry_point(self.current_player)
                 if not self.legal_moves(self.piece_chosen):
-                    self.current_text = "No Legal Moves. Skipping Turn."
-                    self.functions_to_call.append((4+time.time(), lambda: setattr(self, 'current_text', '')))
+                    self.show_text("No Legal Moves. Skipping Turn.")
                     self.rolled = False
                     self.turn += 1
                     self.current_player *= -1
@@ -563,14 +967,23 @@ class Game:
             # elif:
 
             
-            for event in pygame.event.get():
+            for event in events:
                 if event.type == pygame.QUIT:
                     running = False
-                elif event.type == pygame.MOUSEBUTTONDOWN and not self.game_over and not self.winner_decided:
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.invalidate()
+                elif event.type == pygame.MOUSEBUTTONDOWN and not self.game_over and not self.winner_decided and self.humans_turn():
                     mouse_pos = pygame.mouse.get_pos()
                     # Handle mouse clicks (e.g., rolling dice, moving pawns)
-                    if self.can_use_cube[self.current_player == -1]:
-                        pass
+                    if self.cube_offered:
+                        if self.take_rect().collidepoint(mouse_pos):
+                            self.take_double()
+                        elif self.drop_rect().collidepoint(mouse_pos):
+                            self.drop_double()
+                        continue
+                    if self.can_double() and self.cube_rect().collidepoint(mouse_pos):
+                        self.offer_double()
+                        continue
                     for dice in self.dices:
                         if time.time() - self.last_rolled > 0.4 and dice.rect().collidepoint(mouse_pos):
                             if self.turn == 0:
@@ -582,23 +995,16 @@ class Game:
                                     
             
                     if self.rolled and isinstance(self.piece_chosen, int):
-                        for i in range(24):
-                            thing_clicked = False 
-                            if self.can_remove_pieces(self.current_player) and self.bear_rect().collidepoint(mouse_pos):
-                                if self.play_move(self.piece_chosen, -1 if self.current_player == 1 else 24):
-                                    if self.audio_on:
-                                        self.click_sound.play()
-                                    
-                                    self.moves_left.append(0)
-                                    if not any(self.moves_left):
-                                        for dice in self.dices:
-                                            dice.reset()
-                                        self.rolled = False
-                                        self.turn += 1
-                                        self.current_player = -1 if self.current_player == 1 else 1
-                                    self.piece_chosen = None
-                                    break
-                            if point_inside_polygon(self.polygon, self.polygons[i], self.polygon_surface_size, i >= 12):
+                        thing_clicked = False
+                        if (self.can_remove_pieces(self.current_player) and self.bear_rect().collidepoint(mouse_pos)
+                                and self.play_move(self.piece_chosen, off_point(self.current_player))):
+                            if self.audio_on:
+                                self.click_sound.play()
+
+                            if not any(self.moves_left):
+                                self.end_turn()
+                        else:
+                            for i in self.hits.points_at(mouse_pos):
                                 print('Mouse over polygon:', i)
                                 if i in [self.piece_chosen + move for move in self.legal_moves(self.piece_chosen)]:
                                     thing_clicked = True
@@ -609,24 +1015,17 @@ class Game:
                                         # print('Move played:', i)
                                         # print(self.moves_left)
                                         # print(f'removing move {i} - {self.piece_chosen}')
-                                        self.moves_left.append(0)
                                         # print(self.moves_left)
                                         if not any(self.moves_left):
-                                            for dice in self.dices:
-                                                dice.reset()
-                                            self.rolled = False
-                                            self.turn += 1
-                                            self.current_player = -1 if self.current_player == 1 else 1
+                                            self.end_turn()
                                     self.piece_chosen = None
                                     break
                         if not thing_clicked:
                             self.piece_chosen = None
 
                     if self.rolled and not isinstance(self.piece_chosen, int):
-                        for i, rect in enumerate(self.piece_rects):
-                            if isinstance(rect, int):
-                                continue
-                            elif rect.collidepoint(mouse_pos) and (self.current_player * self.pieces[i] > 0):
+                        for i in self.hits.checkers_at(mouse_pos, self.pieces):
+                            if self.current_player * self.pieces[i] > 0:
                                 print(f'Piece {i} clicked.')
                                 if self.legal_moves(i):
                                     print(f'Piece {i} has legal moves.')
@@ -637,22 +1036,21 @@ class Game:
             if self.dices[0].rolled and self.dices[1].rolled and not self.rolled:
                 if self.turn == 0:
                     if self.dices[0].value < self.dices[1].value:
-                        self.current_text = "White player plays first"
-                        self.functions_to_call.append((4+time.time(), lambda: setattr(self, 'current_text', '')))
+                        self.show_text("White player plays first")
                         self.moves_left = [self.dices[0].value, self.dices[1].value, 0, 0]
                         self.rolled = True
                         self.current_player = 1
+                        self.record_roll()
                     elif self.dices[0].value > self.dices[1].value:
-                        self.current_text = "Black player plays first"
-                        self.functions_to_call.append((4+time.time(), lambda: setattr(self, 'current_text', '')))
+                        self.show_text("Black player plays first")
                         self.current_player = -1
                         self.moves_left = [self.dices[0].value, self.dices[1].value, 0, 0]
                         self.rolled = True
+                        self.record_roll()
                     elif self.dices[0].value == self.dices[1].value:
                         self.dices[0].reset()
                         self.dices[1].reset()
-                        self.current_text = "Double rolled! Roll again."
-                        self.functions_to_call.append((4+time.time(), lambda: setattr(self, 'current_text', '')))
+                        self.show_text("Double rolled! Roll again.")
                 else:
                     if self.dices[0].value == self.dices[1].value:
                         self.moves_left = [self.dices[0].value for i in range(4)]
@@ -662,16 +1060,9 @@ class Game:
                         self.moves_left = [self.dices[0].value, self.dices[1].value, 0, 0]
                     self.rolled = True
                     self.last_rolled = time.time()
-                    legal_moves_exist = False
-                    if self.get_player_pieces(self.current_player) == 15:
-                        for i in range(24):
-                            if self.legal_moves(i):
-                                legal_moves_exist = True
-                    else:
-                        legal_moves_exist = self.legal_moves(24 if self.current_player == 1 else -1)
-                    if not legal_moves_exist:
-                        self.current_text = "No legal moves available. Switching player."
-                        self.functions_to_call.append((4+time.time(), lambda: setattr(self, 'current_text', '')))
+                    self.record_roll()
+                    if not self.position.has_legal_move():
+                        self.show_text("No legal moves available. Switching player.")
                         self.rolled = False
                         self.turn += 1
                         self.current_player = -1 if self.current_player == 1 else 1
@@ -680,10 +1071,19 @@ class Game:
                             dice.reset()
                         self.moves_left = [0, 0, 0, 0]
                 # self.current_text.replace(' ', '    ')
-            
-            self.render()
-            clock.tick(60)
-        pygame.quit()
+
+            self.update_bot()
+            busy = self.render() or busy
+            # full frame rate while anything changes, else sleep until input
+            # or whatever is due next
+            timeout = 0 if busy or self.animating() else self.next_wakeup()
+            timeout = max(timeout, frame_start + 1 / self.FPS - time.perf_counter())
+        if self.bot is not None:
+            self.bot.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        # only the window: cached sounds and fonts need the mixer and font modules
+        pygame.display.quit()
 
 
 # Create an instance of the Game class
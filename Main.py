@@ -1,22 +1,28 @@
 import sys
 import os
-from Game import Game
-from about import AboutWindow
-from scores import HighScoresWindow
-from settings import SettingsWindow
-from users import PlayerHistoryViewer
+import time
+
+# for --measure-startup, taken before the Qt imports
+STARTED = time.perf_counter()
+
+from assets import assets
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QPushButton,
-    QLabel, QLineEdit, QMessageBox
+    QLabel, QLineEdit, QMessageBox, QCheckBox
 )
-from PySide6.QtGui import QPixmap, QIcon, QColor, QPalette
-from PySide6.QtCore import Qt, QUrl
-from PySide6.QtMultimediaWidgets import QVideoWidget
-from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
+from PySide6.QtGui import QIcon, QColor, QPalette
+from PySide6.QtCore import Qt, QTimer, QUrl
+
+# Only what the main menu needs is imported up front. The dialogs, the
+# multimedia modules and the match process (and through it pygame) are
+# imported when first opened, so they don't hold up the first frame.
 
 
 class VideoPlayerWindow(QMainWindow):
     def __init__(self, video_path):
+        from PySide6.QtMultimedia import QAudioOutput, QMediaPlayer
+        from PySide6.QtMultimediaWidgets import QVideoWidget
+
         super().__init__()
         self.setWindowTitle("Video Player")
         self.setGeometry(150, 150, 640, 480)
@@ -54,8 +60,27 @@ class BackgammonMenu(QMainWindow):
         self.widgets = []
         self.current_screen = "main_menu"
 
+        # matches run in their own processes; check on them while any are open
+        self.matches = []
+        self.match_timer = QTimer(self)
+        self.match_timer.setInterval(250)
+        self.match_timer.timeout.connect(self.check_matches)
+
+        # the background scaled to the window, redone only when its size changes
+        self.background = None
+        self.background_size = None
+        # called once the first frame is painted, see --measure-startup
+        self.on_first_paint = None
+
         self.show_main_menu()
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.on_first_paint is not None:
+            callback, self.on_first_paint = self.on_first_paint, None
+            # after the children are painted and the frame is flushed
+            QTimer.singleShot(0, callback)
+
     def resizeEvent(self, event):
         self.background_label.setGeometry(0, 0, self.width(), self.height())
         self.overlay_widget.setGeometry(0, 0, self.width(), self.height())
@@ -96,11 +121,13 @@ class BackgammonMenu(QMainWindow):
                 widget.move(center_x - 150, 160)
             elif widget == self.player2_input:
                 widget.move(center_x - 150, 220)
+            elif widget == self.computer_checkbox:
+                widget.move(center_x - 150, 270)
             elif isinstance(widget, QPushButton):
                 if widget.text() == "Start Game":
-                    widget.move(center_x - 160, 300)
+                    widget.move(center_x - 160, 320)
                 elif widget.text() == "Back":
-                    widget.move(center_x + 20, 300)
+                    widget.move(center_x + 20, 320)
 
     def show_main_menu(self):
         self.current_screen = "main_menu"
@@ -135,9 +162,12 @@ class BackgammonMenu(QMainWindow):
 
         self.reposition_widgets()
 
-        pixmap = QPixmap("assets/background.webp")
+        pixmap = assets.pixmap("background.webp")
         if not pixmap.isNull():
-            self.background_label.setPixmap(pixmap.scaled(self.size(), Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation))
+            if self.background_size != self.size():
+                self.background = pixmap.scaled(self.size(), Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
+                self.background_size = self.size()
+                self.background_label.setPixmap(self.background)
             self.background_label.setScaledContents(True)
         else:
             self.background_label.setText("Background Image Not Found")
@@ -164,6 +194,12 @@ class BackgammonMenu(QMainWindow):
         self.player2_input.resize(300, 40)
         self.widgets.append(self.player2_input)
 
+        self.computer_checkbox = QCheckBox("vs Computer", self.overlay_widget)
+        self.computer_checkbox.setStyleSheet("font-size: 20px; color: white;")
+        self.computer_checkbox.resize(300, 30)
+        self.computer_checkbox.toggled.connect(self.toggle_computer)
+        self.widgets.append(self.computer_checkbox)
+
         start_btn = QPushButton("Start Game", self.overlay_widget)
         start_btn.setStyleSheet("background-color: #28A745; color: white; font-size: 18px; padding: 10px 20px;")
         start_btn.resize(140, 40)
@@ -182,6 +218,10 @@ class BackgammonMenu(QMainWindow):
         for widget in self.widgets:
             widget.show()
 
+    def toggle_computer(self, checked):
+        self.player2_input.setText("Computer" if checked else "")
+        self.player2_input.setEnabled(not checked)
+
     def start_game(self):
         p1 = self.player1_input.text().strip()
         p2 = self.player2_input.text().strip()
@@ -201,23 +241,43 @@ class BackgammonMenu(QMainWindow):
             QMessageBox.Yes | QMessageBox.No
         )
         if confirm == QMessageBox.Yes:
-            game = Game(self, (p1, p2), points, [0, 0])
-            game.audio_on = audio
-            game.run()
+            from matchprocess import MatchProcess
+
+            self.matches.append(MatchProcess((p1, p2), points, bool(audio), self.computer_checkbox.isChecked()))
+            self.match_timer.start()
+
+    def check_matches(self):
+        from matchprocess import update_scoreboard
+
+        for match in list(self.matches):
+            if match.poll():
+                self.matches.remove(match)
+                if match.result is not None:
+                    update_scoreboard("scoreboard.csv", match.player_names, match.result)
+        if not self.matches:
+            self.match_timer.stop()
 
     def show_user_history(self):
+        from users import PlayerHistoryViewer
+
         self.player_history_window = PlayerHistoryViewer("scoreboard.csv")
         self.player_history_window.show()
 
     def show_high_scores(self):
+        from scores import HighScoresWindow
+
         self.high_scores_window = HighScoresWindow()
         self.high_scores_window.show()
 
     def show_settings_window(self):
+        from settings import SettingsWindow
+
         self.settings_window = SettingsWindow()
         self.settings_window.show()
 
     def show_about_window(self):
+        from about import AboutWindow
+
         self.about_window = AboutWindow()
         self.about_window.show()
 
@@ -242,6 +302,10 @@ class BackgammonMenu(QMainWindow):
 
 
 if __name__ == "__main__":
+    # print how long the menu took to get on screen, then exit
+    measure_startup = "--measure-startup" in sys.argv
+    if measure_startup:
+        sys.argv.remove("--measure-startup")
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
 
@@ -255,5 +319,17 @@ if __name__ == "__main__":
     app.setPalette(dark_palette)
 
     window = BackgammonMenu()
+
+    def first_paint():
+        if measure_startup:
+            print(f"menu on screen {(time.perf_counter() - STARTED) * 1000:.0f} ms after Main.py started")
+            app.quit()
+            return
+        # decode what the dialogs need while the menu is up, rather than
+        # competing with the first frame; matches load theirs in their own
+        # process, so no pygame here
+        assets.preload(names=(), qt_names=("aboutme_wallpaper.jpg", "email.png", "linkedin.png", "snowwall.webp", "afeka.jpg"))
+
+    window.on_first_paint = first_paint
     window.show()
     sys.exit(app.exec())
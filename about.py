@@ -1,6 +1,6 @@
 from PySide6.QtWidgets import QDialog, QLabel, QPushButton, QApplication
-from PySide6.QtGui import QPixmap
 from PySide6.QtCore import Qt
+from assets import assets
 
 class AboutWindow(QDialog):
     def __init__(self):
@@ -24,7 +24,7 @@ class AboutWindow(QDialog):
         # Background image
         self.background = QLabel(self)
         self.background.setGeometry(0, 0, 650, 330)
-        self.background.setPixmap(QPixmap("assets/aboutme_wallpaper.jpg"))
+        self.background.setPixmap(assets.pixmap("aboutme_wallpaper.jpg"))
         self.background.setScaledContents(True)
 
         # Name label
@@ -34,7 +34,7 @@ class AboutWindow(QDialog):
 
         # Email icon and label
         self.image1 = QLabel(self)
-        self.image1.setPixmap(QPixmap("assets/email.png"))
+        self.image1.setPixmap(assets.pixmap("email.png"))
         self.image1.setGeometry(20, 50, 30, 30)
 
         self.label2 = QLabel("joel.malich@s.afeka.ac.il", self)
@@ -43,7 +43,7 @@ class AboutWindow(QDialog):
 
         # LinkedIn icon and label
         self.image2 = QLabel(self)
-        self.image2.setPixmap(QPixmap("assets/linkedin.png"))
+        self.image2.setPixmap(assets.pixmap("linkedin.png"))
         self.image2.setGeometry(20, 90, 30, 30)
 
         self.label3 = QLabel('<a href="https://www.linkedin.com/in/joel-malich-b04a65202/">Joel Malich</a>', self)
@@ -53,13 +53,13 @@ class AboutWindow(QDialog):
 
         # Big image on the right
         self.image3 = QLabel(self)
-        self.image3.setPixmap(QPixmap("assets/snowwall.webp"))
+        self.image3.setPixmap(assets.pixmap("snowwall.webp"))
         self.image3.setGeometry(320, 10, 300, 300)
         self.image3.setScaledContents(True)
 
         # Bottom left image
         self.image4 = QLabel(self)
-        self.image4.setPixmap(QPixmap("assets/afeka.jpg"))
+        self.image4.setPixmap(assets.pixmap("afeka.jpg"))
         self.image4.setGeometry(40, 190, 220, 100)
         self.image4.setScaledContents(True)
 
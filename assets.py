@@ -0,0 +1,170 @@
+"""
+Shared loader for the images, sounds, fonts and Qt pixmaps in assets/.
+
+Every file is read once per process and everything decoded from it is
+cached, so a reopened window or a later match in the same process costs no
+loading at all:
+
+- image(): a pygame surface, converted for the display (needs one) and
+  optionally scaled; each file is decoded once whatever it is used as.
+- sound() and font(): pygame.mixer.Sound and pygame.font.Font. They stay
+  valid while pygame's mixer and font modules are initialised, so Game only
+  shuts down the display between matches.
+- pixmap(): a QPixmap, for the menu and dialogs.
+
+preload() reads and decodes files in a background thread (both pygame and
+Qt decoders release the GIL); whatever is asked for before it gets there
+is simply loaded on the spot. Matches started from the menu each run in a
+new process (see matchprocess.py) and so start with an empty cache; there
+preload() overlaps decoding with starting pygame and the bot.
+"""
+import io
+import os
+import threading
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+# what a match needs, in the order it needs it
+GAME_ASSETS = (
+    "board.webp", "Stone_White.png", "Stone_Black.png",
+    *(f"digit-{n}-{color}.png" for color in ("white", "black") for n in range(1, 7)),
+    "button.wav", "dice.wav", "font.otf",
+)
+
+
+class AssetManager:
+    """
+    Args:
+        root: directory the asset names are relative to.
+    """
+
+    def __init__(self, root=ASSETS_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._data = {}
+        self._decoded = {}
+        self._images = {}
+        self._sounds = {}
+        self._fonts = {}
+        self._qimages = {}
+        self._pixmaps = {}
+        self._preload = None
+        # pygame surfaces made so far: decoded, converted or scaled
+        self.surfaces = 0
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def data(self, name):
+        """The bytes of a file, read once."""
+        data = self._data.get(name)
+        if data is None:
+            with open(self.path(name), "rb") as f:
+                data = f.read()
+            with self._lock:
+                data = self._data.setdefault(name, data)
+        return data
+
+    def _decode(self, name):
+        import pygame
+
+        surface = self._decoded.get(name)
+        if surface is None:
+            surface = pygame.image.load(io.BytesIO(self.data(name)), name)
+            with self._lock:
+                self.surfaces += 1
+                surface = self._decoded.setdefault(name, surface)
+        return surface
+
+    def image(self, name, alpha=True, size=None):
+        """
+        A surface converted for the display (with per-pixel alpha unless
+        alpha is False), scaled to size if given. Don't draw on it: it is
+        shared.
+        """
+        import pygame
+
+        key = (name, alpha, size)
+        surface = self._images.get(key)
+        if surface is None:
+            surface = self._decode(name)
+            surface = surface.convert_alpha() if alpha else surface.convert()
+            made = 1
+            if size is not None:
+                surface = pygame.transform.scale(surface, size)
+                made += 1
+            with self._lock:
+                # the preload thread counts its decodes under the lock too
+                self.surfaces += made
+                surface = self._images.setdefault(key, surface)
+        return surface
+
+    def sound(self, name):
+        import pygame
+
+        sound = self._sounds.get(name)
+        if sound is None:
+            sound = self._sounds[name] = pygame.mixer.Sound(io.BytesIO(self.data(name)))
+        return sound
+
+    def font(self, name, size):
+        import pygame
+
+        key = (name, size)
+        font = self._fonts.get(key)
+        if font is None:
+            # Font reads the file object lazily, so it gets its own
+            font = self._fonts[key] = pygame.font.Font(io.BytesIO(self.data(name)), size)
+        return font
+
+    def _decode_qimage(self, name):
+        from PySide6.QtGui import QImage
+
+        image = self._qimages.get(name)
+        if image is None:
+            image = QImage.fromData(self.data(name))
+            with self._lock:
+                image = self._qimages.setdefault(name, image)
+        return image
+
+    def pixmap(self, name):
+        """A QPixmap of the file, null if it is missing or can't be decoded; GUI thread only."""
+        from PySide6.QtGui import QPixmap
+
+        pixmap = self._pixmaps.get(name)
+        if pixmap is None:
+            try:
+                pixmap = QPixmap.fromImage(self._decode_qimage(name))
+            except OSError:
+                pixmap = QPixmap()
+            self._pixmaps[name] = pixmap
+        return pixmap
+
+    def preload(self, names=GAME_ASSETS, qt_names=()):
+        """
+        Read and decode files in a background thread: pygame images and
+        the raw bytes of sounds and fonts from names, Qt images from
+        qt_names. Returns the thread.
+        """
+        def run():
+            # a missing or broken file is reported when it is actually used
+            for name in names:
+                try:
+                    if name.endswith((".png", ".jpg", ".webp")):
+                        self._decode(name)
+                    else:
+                        self.data(name)
+                except Exception:
+                    pass
+            for name in qt_names:
+                try:
+                    self._decode_qimage(name)
+                except Exception:
+                    pass
+
+        self._preload = threading.Thread(target=run, daemon=True)
+        self._preload.start()
+        return self._preload
+
+
+assets = AssetManager()
@@ -0,0 +1,170 @@
+"""
+One-sided bear-off database.
+
+For every layout of up to 15 checkers on the six home points the database
+holds the probability distribution of the number of rolls needed to bear
+them all off (with the play that minimises the expected number of rolls),
+plus the expected number of rolls itself. The file is a small header
+followed by two flat arrays and is opened with mmap, so lookups read
+straight from the page cache without parsing anything at startup.
+
+Build it once with:
+
+    python bearoff.py [checkers] [path]
+"""
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import product
+
+from engine import legal_plays
+
+POINTS = 6
+MAX_ROLLS = 32
+MAGIC = b"BGBO"
+HEADER = struct.Struct("<4sHHHI")
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bearoff.db")
+ROLLS = [(d1, d2) for d1 in range(1, 7) for d2 in range(d1, 7)]
+
+
+def layout_count(checkers, points=POINTS):
+    """Number of layouts of 0..checkers checkers on `points` points."""
+    return math.comb(checkers + points, points)
+
+
+def layout_index(layout):
+    """
+    Rank a layout (checkers on the 1..6 points, in that order).
+
+    Layouts are seen as 15 checkers and 6 separators in a row; the rank is
+    the combinatorial number of the separator positions.
+    """
+    index = 0
+    position = -1
+    for i, n in enumerate(layout):
+        position += n + 1
+        index += math.comb(position, i + 1)
+    return index
+
+
+def home_layout(board, player):
+    """The player's home board of a 26-entry board, 1-point first."""
+    if player == 1:
+        return tuple(board[:POINTS])
+    return tuple(-board[23 - i] for i in range(POINTS))
+
+
+def in_bearoff(board, player):
+    """True if every checker the player has left is in their home board."""
+    if board[24 if player == 1 else 25]:
+        return False
+    points = range(POINTS, 24) if player == 1 else range(0, 24 - POINTS)
+    return not any(board[i] * player > 0 for i in points)
+
+
+def build(checkers=15):
+    """Compute the database; returns (distributions, means) as arrays."""
+    count = layout_count(checkers)
+    layouts = [layout for layout in product(range(checkers + 1), repeat=POINTS) if sum(layout) <= checkers]
+    # every play lowers the pip count, so successors are always done first
+    layouts.sort(key=lambda layout: sum((i + 1) * n for i, n in enumerate(layout)))
+    means = [0.0] * count
+    dists = [None] * count
+    dists[layout_index((0,) * POINTS)] = [1.0] + [0.0] * (MAX_ROLLS - 1)
+    empty = (0,) * (24 - POINTS) + (0, 0)
+    for layout in layouts[1:]:
+        board = layout + empty
+        dist = [0.0] * MAX_ROLLS
+        for d1, d2 in ROLLS:
+            weight = (1 if d1 == d2 else 2) / 36
+            best = min((layout_index(b[:POINTS]) for _, b in legal_plays(board, 1, d1, d2)), key=means.__getitem__)
+            for k, p in enumerate(dists[best][:-1]):
+                dist[k + 1] += weight * p
+        index = layout_index(layout)
+        dists[index] = dist
+        means[index] = sum(k * p for k, p in enumerate(dist))
+    table = array("H", (round(p * 65535) for dist in dists for p in dist))
+    return table, array("f", means)
+
+
+def write(path=DEFAULT_PATH, checkers=15):
+    table, means = build(checkers)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 1, checkers, MAX_ROLLS, len(means)))
+        table.tofile(f)
+        means.tofile(f)
+    os.replace(tmp, path)
+
+
+class BearoffDatabase:
+    """
+    Read-only view of a database file written by write().
+
+    Args:
+        path: database file.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.checkers, self.max_rolls, self.count = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != 1:
+            raise ValueError(f"{path} is not a bear-off database")
+        view = memoryview(self._mmap)
+        table_end = HEADER.size + self.count * self.max_rolls * 2
+        self._table = view[HEADER.size:table_end].cast("H")
+        self._means = view[table_end:table_end + self.count * 4].cast("f")
+
+    def __reduce__(self):
+        # the mapping can't be pickled; other processes open the same file
+        return type(self), (self.path,)
+
+    def close(self):
+        self._table.release()
+        self._means.release()
+        self._mmap.close()
+
+    def __contains__(self, layout):
+        return sum(layout) <= self.checkers
+
+    def distribution(self, layout):
+        """P(bearing off takes exactly k rolls) for k = 0 .. max_rolls - 1."""
+        start = layout_index(layout) * self.max_rolls
+        return [n / 65535 for n in self._table[start:start + self.max_rolls]]
+
+    def expected_rolls(self, layout):
+        return self._means[layout_index(layout)]
+
+    def win_probability(self, board, player):
+        """
+        Chance the player on roll bears off first when both sides are in the
+        database. Gammons are not considered.
+        """
+        mine = self.distribution(home_layout(board, player))
+        theirs = self.distribution(home_layout(board, -player))
+        # the player on roll wins ties, so they win if the opponent needs at least as many rolls
+        at_least = 1.0
+        win = 0.0
+        for k in range(self.max_rolls):
+            win += mine[k] * at_least
+            at_least -= theirs[k]
+        return win
+
+    def best_play(self, board, player, d1, d2):
+        """The (moves, board) play that leaves the fewest expected rolls."""
+        return min(legal_plays(board, player, d1, d2), key=lambda play: self.expected_rolls(home_layout(play[1], player)))
+
+
+if __name__ == "__main__":
+    import time
+
+    checkers = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_PATH
+    start = time.perf_counter()
+    write(path, checkers)
+    print(f"{layout_count(checkers)} layouts written to {path} in {time.perf_counter() - start:.1f}s")
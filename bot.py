@@ -0,0 +1,112 @@
+"""
+Computer opponent for Game.
+
+The bot searches in a separate worker process, so however deep it looks
+the pygame loop keeps drawing at full frame rate; Game.run only starts a
+search when the bot's dice are down and then polls it once per frame.
+
+Without trained weights (weights.npz next to this module, e.g. a copy of
+train.py's latest.npz) the bot falls back to rollout.heuristic, never
+doubles and takes every double.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.npz")
+
+_search = None
+_advisor = None
+
+
+def _start_worker(weights, plies, time_budget, cube_plies):
+    global _search, _advisor
+    from bearoff import DEFAULT_PATH, BearoffDatabase
+    from cube import CubeAdvisor
+    from evaluator import Evaluator
+    from search import Search
+
+    if os.path.exists(weights):
+        bearoff = BearoffDatabase() if os.path.exists(DEFAULT_PATH) else None
+        _search = Search(Evaluator.load(weights, bearoff), plies=plies, time_budget=time_budget)
+        _advisor = CubeAdvisor(lambda board, player: _search.evaluate(board, player, cube_plies))
+
+
+def _think(board, player, d1, d2):
+    """Worker task: the moves of the play to make, as (piece, move) pairs."""
+    if _search is not None:
+        from evaluator import invert
+
+        moves, after, probs, _ = _search.rank_plays(board, player, d1, d2)[0]
+        # the opponent's cube decisions in this position come for free now
+        _advisor.remember(after, -player, invert(probs[None])[0])
+        return moves
+    from engine import legal_plays
+    from rollout import heuristic
+
+    return max(legal_plays(board, player, d1, d2), key=lambda play: heuristic(play[1], player))[0]
+
+
+def _double(board, player, owner):
+    """Worker task: whether `player`, on roll in board, should double."""
+    return _advisor is not None and _advisor.should_double(board, player, owner)
+
+
+def _take(board, doubler, owner):
+    """Worker task: whether to take a double from `doubler`, on roll in board."""
+    return _advisor is None or _advisor.should_take(board, doubler, owner)
+
+
+class Bot:
+    """
+    Args:
+        player: the side the bot plays, 1 (white) or -1 (black).
+        plies: search depth, see search.Search.
+        time_budget: seconds the bot may think per move.
+        weights: evaluator weights file.
+        cube_plies: search depth of the probabilities behind cube decisions.
+    """
+
+    def __init__(self, player, plies=2, time_budget=2.0, weights=WEIGHTS_PATH, cube_plies=1):
+        self.player = player
+        # spawn rather than fork: the parent holds an SDL window
+        self._pool = ProcessPoolExecutor(1, multiprocessing.get_context("spawn"), _start_worker,
+                                         (weights, plies, time_budget, cube_plies))
+        self._future = None
+        # start the worker (and its imports) now rather than on the bot's first move
+        self._pool.submit(int)
+
+    @property
+    def thinking(self):
+        return self._future is not None and not self._future.done()
+
+    def start(self, board, d1, d2):
+        """Start choosing a play for board (Position.board() layout) and roll d1-d2."""
+        self._future = self._pool.submit(_think, board, self.player, d1, d2)
+
+    def start_double(self, board, owner):
+        """Start deciding whether to double before rolling; owner as in cube.py."""
+        self._future = self._pool.submit(_double, board, self.player, owner)
+
+    def start_take(self, board, owner):
+        """Start deciding whether to take the opponent's double; owner is the doubler's view."""
+        self._future = self._pool.submit(_take, board, -self.player, owner)
+
+    def poll(self):
+        """
+        The answer to the last request once it is ready, else None: a list
+        of moves from start(), a bool from start_double() or start_take().
+        Each answer is returned once.
+        """
+        if self._future is None or not self._future.done():
+            return None
+        result = self._future.result()
+        self._future = None
+        return list(result) if isinstance(result, tuple) else result
+
+    def forget(self):
+        """Drop the pending request, e.g. when the round ends."""
+        self._future = None
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,157 @@
+"""
+Doubling cube decisions for money play.
+
+Cubeless probabilities (evaluator outputs for the side on roll) are turned
+into cubeful equities with Rick Janowski's cube-efficiency model: the real
+equity lies between the dead-cube equity and a "live cube" equity that
+assumes every cube is turned exactly at the take or cash point, weighted by
+the cube efficiency x. The model is the one gnubg uses to make its 0-ply
+evaluations cubeful.
+
+All equities are for the side on roll, per unit of the current cube.
+"""
+from engine import TURN_KEY, board_key
+from evaluator import LOSE_BACKGAMMON, LOSE_GAMMON, WIN, WIN_BACKGAMMON, WIN_GAMMON, equity
+from transposition import TranspositionTable
+
+# who owns the cube, seen from the side on roll
+CENTERED = 0
+OWNED = 1
+UNAVAILABLE = -1
+
+CONTACT_EFFICIENCY = 0.68
+
+
+def cube_efficiency(board, player):
+    """
+    Cube efficiency of a position: a fixed value while the sides are in
+    contact, in a race one that grows with the pip count of the side on roll.
+    """
+    points = board[:24]
+    mine = [i for i, v in enumerate(points) if v * player > 0]
+    theirs = [i for i, v in enumerate(points) if v * player < 0]
+    if player == 1:
+        back = 24 if board[24] else max(mine, default=-1)
+        their_back = -1 if board[25] else min(theirs, default=24)
+        contact = back > their_back
+        pips = board[24] * 25 + sum(points[i] * (i + 1) for i in mine)
+    else:
+        back = -1 if board[25] else min(mine, default=24)
+        their_back = 24 if board[24] else max(theirs, default=-1)
+        contact = back < their_back
+        pips = board[25] * 25 - sum(points[i] * (24 - i) for i in mine)
+    if contact:
+        return CONTACT_EFFICIENCY
+    return min(max(0.55 + 0.00125 * pips, 0.6), 0.7)
+
+
+def cubeful_equity(probs, x, owner=CENTERED):
+    """
+    Janowski cubeful equity of probabilities for the side on roll.
+
+    Args:
+        probs: evaluator outputs for the side on roll.
+        x: cube efficiency, 0 (dead cube) to 1 (fully live).
+        owner: CENTERED, OWNED (by the side on roll) or UNAVAILABLE.
+    """
+    p = float(probs[WIN])
+    # average value of the games won and lost
+    won = 1 + (probs[WIN_GAMMON] + probs[WIN_BACKGAMMON]) / p if p > 1e-7 else 1.0
+    lost = 1 + (probs[LOSE_GAMMON] + probs[LOSE_BACKGAMMON]) / (1 - p) if p < 1 - 1e-7 else 1.0
+    dead = float(equity(probs))
+    take_point = (lost - 0.5) / (won + lost + 0.5 * x)
+    cash_point = (lost + 1) / (won + lost + 0.5 * x)
+    if owner == CENTERED:
+        if p <= take_point:
+            live = -lost + (lost - 1) * p / take_point
+        elif p < cash_point:
+            live = -1 + 2 * (p - take_point) / (cash_point - take_point)
+        else:
+            live = 1 + (won - 1) * (p - cash_point) / (1 - cash_point)
+    elif owner == OWNED:
+        if p <= cash_point:
+            live = -lost + (lost + 1) * p / cash_point
+        else:
+            live = 1 + (won - 1) * (p - cash_point) / (1 - cash_point)
+    else:
+        if p <= take_point:
+            live = -lost + (lost - 1) * p / take_point
+        else:
+            live = -1 + (won + 1) * (p - take_point) / (1 - take_point)
+    return dead * (1 - x) + live * x
+
+
+class CubeDecision:
+    """
+    Equities of the three cube actions for the side on roll, per unit of the
+    current cube: no double, double and take, double and pass.
+    """
+
+    def __init__(self, probs, x, owner=CENTERED):
+        self.no_double = cubeful_equity(probs, x, owner)
+        self.double_take = 2 * cubeful_equity(probs, x, UNAVAILABLE)
+        self.double_pass = 1.0
+
+    @property
+    def should_double(self):
+        return min(self.double_take, self.double_pass) > self.no_double
+
+    @property
+    def should_take(self):
+        return self.double_take <= self.double_pass
+
+    def __repr__(self):
+        return (f"CubeDecision(no_double={self.no_double:+.3f}, double_take={self.double_take:+.3f}, "
+                f"double_pass={self.double_pass:+.3f})")
+
+
+class CubeAdvisor:
+    """
+    Cube decisions for positions, memoised together with the cubeless
+    probabilities they were made from in a transposition table. A player that has just evaluated
+    its move can remember() the probabilities of the position it played
+    into, so answering a double there costs no evaluation at all.
+
+    Args:
+        evaluate: function(board, player) -> probabilities for the side on
+            roll, e.g. search.Search.evaluate.
+        size: table entries.
+    """
+
+    def __init__(self, evaluate, size=1 << 14):
+        self.evaluate = evaluate
+        self.table = TranspositionTable(size)
+
+    @staticmethod
+    def _key(board, player):
+        return board_key(board) ^ (TURN_KEY if player == -1 else 0)
+
+    def remember(self, board, player, probs):
+        """Store probabilities for `player` on roll in board."""
+        self.table.put(self._key(board, player), 0, probs)
+
+    def probs(self, board, player):
+        key = self._key(board, player)
+        hit = self.table.get(key)
+        if hit is not None:
+            return hit[0]
+        probs = self.evaluate(board, player)
+        self.table.put(key, 0, probs)
+        return probs
+
+    def decision(self, board, player, owner=CENTERED):
+        """CubeDecision for `player`, who is on roll in board and may double."""
+        key = (self._key(board, player), owner)
+        hit = self.table.get(key)
+        if hit is not None:
+            return hit[0]
+        decision = CubeDecision(self.probs(board, player), cube_efficiency(board, player), owner)
+        self.table.put(key, 0, decision)
+        return decision
+
+    def should_double(self, board, player, owner=CENTERED):
+        return self.decision(board, player, owner).should_double
+
+    def should_take(self, board, doubler, owner=CENTERED):
+        """Whether the opponent of `doubler` (on roll in board) should take."""
+        return self.decision(board, doubler, owner).should_take
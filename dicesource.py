@@ -0,0 +1,152 @@
+"""
+Sources of dice for the game window and the headless engine.
+
+Every source hands out single dice with die() and pairs with roll(), and
+iterates over rolls, so it can be passed straight to rollout.play_out().
+A source made with record=True keeps every die it produced in `log`, and
+ReplayDice plays such a log back; with the same seed a game gets exactly
+the same dice again.
+
+- RandomDice: random.Random, seeded.
+- BlockDice: NumPy, generated a block at a time for simulations that need
+  millions of rolls.
+- StratifiedDice: the first turns of game i take roll i of a shuffled list
+  of the 36 combinations, so a set of 36 games sees every roll once per
+  turn (rollouts).
+- ReplayDice: a recorded log.
+"""
+import random
+
+import numpy as np
+
+ROLLS = [(d1, d2) for d1 in range(1, 7) for d2 in range(1, 7)]
+
+
+class DiceSource:
+    """
+    Base class; subclasses implement _die() and may override _roll().
+
+    Args:
+        record: keep every die produced in self.log.
+    """
+
+    def __init__(self, record=False):
+        self.log = [] if record else None
+
+    def _die(self):
+        raise NotImplementedError
+
+    def _roll(self):
+        return self._die(), self._die()
+
+    def die(self):
+        value = self._die()
+        if self.log is not None:
+            self.log.append(value)
+        return value
+
+    def roll(self):
+        dice = self._roll()
+        if self.log is not None:
+            self.log.extend(dice)
+        return dice
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.roll()
+
+
+class RandomDice(DiceSource):
+    """
+    Args:
+        seed: seed of the generator; a random one (kept in self.seed) if None.
+    """
+
+    def __init__(self, seed=None, record=False):
+        super().__init__(record)
+        self.seed = random.randrange(1 << 63) if seed is None else seed
+        self.random = random.Random(self.seed)
+
+    def _die(self):
+        return self.random.randint(1, 6)
+
+
+class BlockDice(DiceSource):
+    """
+    Args:
+        seed: seed of the NumPy generator; a random one if None.
+        block: dice generated per refill.
+    """
+
+    def __init__(self, seed=None, block=1 << 20, record=False):
+        super().__init__(record)
+        self.seed = random.randrange(1 << 63) if seed is None else seed
+        self.block = block
+        self._rng = np.random.default_rng(self.seed)
+        self._dice = []
+        self._next = 0
+
+    def _refill(self):
+        # a plain list makes every single draw an index, not a NumPy scalar
+        self._dice = self._rng.integers(1, 7, self.block, dtype=np.uint8).tolist()
+        self._next = 0
+
+    def _die(self):
+        if self._next == len(self._dice):
+            self._refill()
+        self._next += 1
+        return self._dice[self._next - 1]
+
+    def _roll(self):
+        if self._next + 2 > len(self._dice):
+            return self._die(), self._die()
+        self._next += 2
+        return self._dice[self._next - 2], self._dice[self._next - 1]
+
+
+class StratifiedDice(RandomDice):
+    """
+    Quasi-random dice for sets of games. Call start_game(i) before game i;
+    its first `quasi_turns` rolls then come from shuffled permutations of the
+    36 combinations and the rest from the seeded generator.
+    """
+
+    def __init__(self, seed=None, quasi_turns=2, record=False):
+        super().__init__(seed, record)
+        self.perms = []
+        for _ in range(quasi_turns):
+            perm = ROLLS[:]
+            self.random.shuffle(perm)
+            self.perms.append(perm)
+        self.start_game(0)
+
+    def start_game(self, index):
+        self.game = index
+        self.turn = 0
+
+    def _roll(self):
+        turn = self.turn
+        self.turn += 1
+        if turn < len(self.perms):
+            return self.perms[turn][self.game % 36]
+        return self._die(), self._die()
+
+
+class ReplayDice(DiceSource):
+    """
+    Args:
+        log: dice recorded by another source (its `log`).
+    """
+
+    def __init__(self, log, record=False):
+        super().__init__(record)
+        self._log = list(log)
+        self._next = 0
+
+    def _die(self):
+        if self._next == len(self._log):
+            raise ValueError("the dice log is exhausted")
+        self._next += 1
+        return self._log[self._next - 1]
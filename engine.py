@@ -0,0 +1,456 @@
+"""
+Headless backgammon rules.
+
+The board uses the same layout as Game.pieces: 24 points where positive
+counts are white checkers (player 1) and negative counts are black checkers
+(player -1). White moves from point 23 towards point 0, enters from the bar
+at 24 and bears off below 0. Black moves the other way, enters from -1 and
+bears off at 24. Per-side lists (bar, pieces_removed) are indexed with
+``player == -1`` exactly like Game does.
+
+Nothing in here imports pygame, so positions can be simulated and analysed
+without bringing up a display.
+"""
+
+import random
+
+WHITE = 1
+BLACK = -1
+CHECKERS = 15
+START = (-2, 0, 0, 0, 0, 5, 0, 3, 0, 0, 0, -5, 5, 0, 0, 0, -3, 0, -5, 0, 0, 0, 0, 2)
+
+
+def flip(board):
+    """Mirror a 26-entry board so black's checkers look like white's."""
+    return tuple([-p for p in board[23::-1]] + [board[25], board[24]])
+
+
+def board_result(board, player):
+    """
+    Points won by player on a 26-entry board: 0 while they still have
+    checkers to bear off, else 1, 2 (gammon) or 3 (backgammon).
+    """
+    b = board if player == 1 else flip(board)
+    if b[24] or any(v > 0 for v in b[:24]):
+        return 0
+    if sum(-v for v in b[:24] if v < 0) + b[25] < CHECKERS:
+        return 1
+    if b[25] or any(v < 0 for v in b[:6]):
+        return 3
+    return 2
+
+
+def entry_point(player):
+    """Index a checker on the bar moves from."""
+    return 24 if player == 1 else -1
+
+
+def off_point(player):
+    """Index a checker is borne off to."""
+    return -1 if player == 1 else 24
+
+
+# Per-side lookup tables indexed [player == -1][point]
+PIP = (tuple(i + 1 for i in range(24)), tuple(24 - i for i in range(24)))
+HOME = (tuple(i < 6 for i in range(24)), tuple(i >= 18 for i in range(24)))
+BAR_PIP = 25
+
+# Zobrist keys, seeded so every process agrees on them. POINT_KEYS[i][n + 15]
+# is the key for n signed checkers on point i, BAR_KEYS[side][n] for n
+# checkers on that side's bar. Empty points and bars contribute nothing.
+_rng = random.Random(0x6261636B)
+POINT_KEYS = tuple(tuple(0 if n == CHECKERS else _rng.getrandbits(64) for n in range(2 * CHECKERS + 1)) for _ in range(24))
+BAR_KEYS = tuple(tuple(0 if n == 0 else _rng.getrandbits(64) for n in range(CHECKERS + 1)) for _ in range(2))
+TURN_KEY = _rng.getrandbits(64)
+del _rng
+
+
+def board_key(board):
+    """Zobrist key of a 26-entry board, equal to Position.key for the same checkers."""
+    key = BAR_KEYS[0][board[24]] ^ BAR_KEYS[1][board[25]]
+    for i in range(24):
+        key ^= POINT_KEYS[i][board[i] + CHECKERS]
+    return key
+
+
+class Position:
+    """
+    A backgammon position with the side to move and the dice left to play.
+
+    Per-side aggregates (checkers on the board, pip counts, checkers in the
+    home board and the furthest-back checker) and the Zobrist key of the
+    checkers are kept up to date by every move, so the rule queries below
+    never scan the board and hash(position) costs nothing. Code that edits
+    `pieces` or `bar` directly must call recount() afterwards.
+
+    Args:
+        pieces: 24 signed point counts (Game.pieces layout).
+        pieces_removed: borne-off counts [white, black].
+        current_player: 1, -1 or 0 before the opening roll.
+        moves_left: dice still to be played, 0 marks a used die.
+        bar: checkers on the bar [white, black]; derived from the other
+            counts when omitted.
+    """
+    __slots__ = ('pieces', 'bar', 'pieces_removed', 'current_player', 'moves_left',
+                 'counts', 'pips', 'home', 'furthest', 'key')
+
+    def __init__(self, pieces=START, pieces_removed=(0, 0), current_player=0, moves_left=(0, 0, 0, 0), bar=None):
+        self.pieces = list(pieces)
+        self.pieces_removed = list(pieces_removed)
+        self.current_player = current_player
+        self.moves_left = list(moves_left)
+        if bar is None:
+            bar = [CHECKERS - sum(p for p in self.pieces if p > 0) - self.pieces_removed[0],
+                   CHECKERS + sum(p for p in self.pieces if p < 0) - self.pieces_removed[1]]
+        self.bar = list(bar)
+        self.recount()
+
+    def recount(self):
+        """Rebuild the per-side aggregates from the board."""
+        self.counts = [0, 0]
+        self.pips = [self.bar[0] * BAR_PIP, self.bar[1] * BAR_PIP]
+        self.home = [0, 0]
+        self.furthest = [None, None]
+        self.key = BAR_KEYS[0][self.bar[0]] ^ BAR_KEYS[1][self.bar[1]]
+        for i, p in enumerate(self.pieces):
+            self.key ^= POINT_KEYS[i][p + CHECKERS]
+            if p:
+                side = p < 0
+                n = abs(p)
+                self.counts[side] += n
+                self.pips[side] += n * PIP[side][i]
+                self.home[side] += n * HOME[side][i]
+                if not side or self.furthest[1] is None:
+                    self.furthest[side] = i
+
+    @classmethod
+    def from_board(cls, board, current_player=0):
+        """Build a position from a 26-entry board (24 points, then bar counts)."""
+        pieces = board[:24]
+        pieces_removed = (CHECKERS - sum(p for p in pieces if p > 0) - board[24],
+                          CHECKERS + sum(p for p in pieces if p < 0) - board[25])
+        return cls(pieces, pieces_removed, current_player, bar=board[24:26])
+
+    def board(self):
+        """The 24 points followed by the bar counts, as a hashable tuple."""
+        return tuple(self.pieces) + tuple(self.bar)
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.pieces = self.pieces[:]
+        position.bar = self.bar[:]
+        position.pieces_removed = self.pieces_removed[:]
+        position.current_player = self.current_player
+        position.moves_left = self.moves_left[:]
+        position.counts = self.counts[:]
+        position.pips = self.pips[:]
+        position.home = self.home[:]
+        position.furthest = self.furthest[:]
+        position.key = self.key
+        return position
+
+    def reset(self):
+        self.__init__()
+
+    def __eq__(self, other):
+        return (isinstance(other, Position) and self.pieces == other.pieces and self.bar == other.bar
+                and self.pieces_removed == other.pieces_removed and self.current_player == other.current_player)
+
+    def __hash__(self):
+        return self.key ^ TURN_KEY if self.current_player == -1 else self.key
+
+    def __repr__(self):
+        return f"Position({self.pieces}, bar={self.bar}, off={self.pieces_removed}, player={self.current_player}, dice={self.moves_left})"
+
+    # Dice and turn handling
+
+    def set_dice(self, d1, d2):
+        self.moves_left = [d1] * 4 if d1 == d2 else [d1, d2, 0, 0]
+
+    def roll(self, dice):
+        """Roll with a dicesource.DiceSource and set the dice; returns them."""
+        d1, d2 = dice.roll()
+        self.set_dice(d1, d2)
+        return d1, d2
+
+    def switch_turn(self):
+        self.current_player = -1 if self.current_player == 1 else 1
+        self.moves_left = [0, 0, 0, 0]
+
+    # Queries
+
+    def get_player_pieces(self, player):
+        """Number of checkers the player has on the 24 points."""
+        return self.counts[player == -1]
+
+    def player_has_dead_pieces(self, player):
+        return self.bar[player == -1] > 0
+
+    def get_player_piece_positions(self, player):
+        return [i for i, p in enumerate(self.pieces) if p * player > 0]
+
+    def get_furthest_piece(self, player):
+        return self.furthest[player == -1]
+
+    def can_remove_pieces(self, player):
+        side = player == -1
+        return self.home[side] + self.pieces_removed[side] == CHECKERS
+
+    def get_pip(self, player):
+        return self.pips[player == -1]
+
+    def get_points_to_give(self, player):
+        """
+        Points won by player if they have borne off every checker:
+        1 for a single game, 2 for a gammon and 3 for a backgammon.
+        Returns 0 while the game is still going.
+        """
+        if self.pieces_removed[player == -1] != CHECKERS:
+            return 0
+        loser = -player
+        if self.pieces_removed[loser == -1]:
+            return 1
+        home = range(0, 6) if player == 1 else range(18, 24)
+        if self.bar[loser == -1] or any(self.pieces[i] * loser > 0 for i in home):
+            return 3
+        return 2
+
+    def winner(self):
+        for player in (1, -1):
+            if self.pieces_removed[player == -1] == CHECKERS:
+                return player
+        return 0
+
+    # Moves
+
+    def target(self, piece, die):
+        """
+        Where the current player's checker on `piece` lands with `die`, or
+        None if that move is illegal. Bear-offs return an index off the board.
+        """
+        player = self.current_player
+        if not player or not die:
+            return None
+        if piece == entry_point(player):
+            if not self.bar[player == -1]:
+                return None
+        elif self.bar[player == -1] or not 0 <= piece <= 23 or self.pieces[piece] * player <= 0:
+            return None
+        ind = piece - die * player
+        if 0 <= ind <= 23:
+            return ind if self.pieces[ind] * player >= -1 else None
+        if not self.can_remove_pieces(player):
+            return None
+        if ind == off_point(player) or piece == self.get_furthest_piece(player):
+            return ind
+        return None
+
+    def legal_moves(self, piece):
+        """Signed offsets the checker on `piece` can move with the dice left."""
+        moves = []
+        for die in self.moves_left:
+            val = -die * self.current_player
+            if val not in moves and self.target(piece, die) is not None:
+                moves.append(val)
+        return moves
+
+    def has_legal_move(self):
+        player = self.current_player
+        if self.bar[player == -1]:
+            return bool(self.legal_moves(entry_point(player)))
+        return any(self.legal_moves(i) for i in self.get_player_piece_positions(player))
+
+    def play_move(self, piece, move):
+        """
+        Move the current player's checker from `piece` to `move` and mark the
+        die as used. Any index off the board bears the checker off, using the
+        exact die when there is one and the smallest larger die otherwise.
+        Returns False and leaves the position untouched if the move is illegal.
+        """
+        if 0 <= move <= 23:
+            die = abs(piece - move)
+            if die not in self.moves_left or self.target(piece, die) != move:
+                return False
+        else:
+            dice = [d for d in self.moves_left if d and not 0 <= piece - d * self.current_player <= 23
+                    and self.target(piece, d) is not None]
+            if not dice:
+                return False
+            die = min(dice)
+        self._apply(piece, piece - die * self.current_player)
+        self.moves_left[self.moves_left.index(die)] = 0
+        return True
+
+    def legal_plays(self, d1, d2):
+        """Every distinct play for the side to move, see legal_plays()."""
+        return legal_plays(self.board(), self.current_player, d1, d2)
+
+    def play(self, moves):
+        """Play a sequence of (piece, move) pairs, stopping at the first illegal one."""
+        return all(self.play_move(piece, move) for piece, move in moves)
+
+    def _apply(self, piece, move):
+        player = self.current_player
+        side = player == -1
+        pieces = self.pieces
+        bar = self.bar
+        key = self.key
+        if piece == entry_point(player):
+            key ^= BAR_KEYS[side][bar[side]]
+            bar[side] -= 1
+            key ^= BAR_KEYS[side][bar[side]]
+            self.pips[side] -= BAR_PIP
+        else:
+            keys = POINT_KEYS[piece]
+            key ^= keys[pieces[piece] + CHECKERS]
+            pieces[piece] -= player
+            key ^= keys[pieces[piece] + CHECKERS]
+            self.counts[side] -= 1
+            self.pips[side] -= PIP[side][piece]
+            self.home[side] -= HOME[side][piece]
+        if not 0 <= move <= 23:
+            self.pieces_removed[side] += 1
+        else:
+            keys = POINT_KEYS[move]
+            key ^= keys[pieces[move] + CHECKERS]
+            if pieces[move] == -player:
+                other = not side
+                pieces[move] = player
+                key ^= BAR_KEYS[other][bar[other]]
+                bar[other] += 1
+                key ^= BAR_KEYS[other][bar[other]]
+                self.counts[other] -= 1
+                self.pips[other] += BAR_PIP - PIP[other][move]
+                self.home[other] -= HOME[other][move]
+                if self.furthest[other] == move:
+                    self._find_furthest(other, move)
+            else:
+                pieces[move] += player
+            key ^= keys[pieces[move] + CHECKERS]
+            self.counts[side] += 1
+            self.pips[side] += PIP[side][move]
+            self.home[side] += HOME[side][move]
+        self.key = key
+        furthest = self.furthest[side]
+        if 0 <= move <= 23 and (furthest is None or (move - furthest) * player > 0):
+            self.furthest[side] = move
+        elif piece == furthest and pieces[piece] * player <= 0:
+            self._find_furthest(side, piece)
+
+    def _find_furthest(self, side, start):
+        """Walk from a vacated furthest point towards home to find the next checker."""
+        pieces = self.pieces
+        if side:
+            for i in range(start, 24):
+                if pieces[i] < 0:
+                    self.furthest[side] = i
+                    return
+        else:
+            for i in range(start, -1, -1):
+                if pieces[i] > 0:
+                    self.furthest[side] = i
+                    return
+        self.furthest[side] = None
+
+def _steps(board, die):
+    """
+    Single-checker moves of `die` for the side moving down the board (white).
+    Returns (piece, move, new_board) triples; bear-offs use -1 as the move.
+    """
+    steps = []
+    if board[24]:
+        move = 24 - die
+        v = board[move]
+        if v >= -1:
+            nb = list(board)
+            nb[24] -= 1
+            if v == -1:
+                nb[move] = 1
+                nb[25] += 1
+            else:
+                nb[move] = v + 1
+            steps.append((24, move, tuple(nb)))
+        return steps
+    furthest = 23
+    while furthest >= 0 and board[furthest] <= 0:
+        furthest -= 1
+    bear_off = furthest < 6
+    for piece in range(furthest, -1, -1):
+        if board[piece] <= 0:
+            continue
+        move = piece - die
+        if move >= 0:
+            v = board[move]
+            if v < -1:
+                continue
+            nb = list(board)
+            nb[piece] -= 1
+            if v == -1:
+                nb[move] = 1
+                nb[25] += 1
+            else:
+                nb[move] = v + 1
+        elif bear_off and (move == -1 or piece == furthest):
+            nb = list(board)
+            nb[piece] -= 1
+            move = -1
+        else:
+            continue
+        steps.append((piece, move, tuple(nb)))
+    return steps
+
+
+def _plays(board, d1, d2):
+    orders = ((d1,) * 4,) if d1 == d2 else ((d1, d2), (d2, d1))
+    plays = {}
+    used = 0
+    larger = {}
+    for order in orders:
+        level = {board: ()}
+        depth = 0
+        for die in order:
+            nxt = {}
+            for b, moves in level.items():
+                for piece, move, nb in _steps(b, die):
+                    if nb not in nxt:
+                        nxt[nb] = moves + ((piece, move),)
+            if not nxt:
+                break
+            level = nxt
+            depth += 1
+        if depth > used:
+            used = depth
+            plays = {}
+        if depth == used:
+            for b, moves in level.items():
+                plays.setdefault(b, moves)
+            if depth == 1 and order[0] == max(d1, d2):
+                larger = level
+    if used == 0:
+        return [((), board)]
+    if used == 1 and larger:
+        plays = larger
+    return [(moves, b) for b, moves in plays.items()]
+
+
+def legal_plays(board, player, d1, d2):
+    """
+    Every distinct position the player can reach with the roll d1-d2.
+
+    Plays must use as many dice as possible and, when only one die of a
+    non-double can be used, the larger one if it can be. Final positions are
+    deduplicated by their board tuple.
+
+    Args:
+        board: 26-entry board (Position.board() layout).
+        player: side to move, 1 or -1.
+        d1, d2: the dice.
+
+    Returns:
+        List of (moves, board) where moves is a tuple of (piece, move) pairs
+        in Game indices. If nothing can be played the only play is ((), board).
+    """
+    if player == -1:
+        return [(tuple((23 - piece, 23 - move) for piece, move in moves), flip(b))
+                for moves, b in _plays(flip(board), d1, d2)]
+    return _plays(board, d1, d2)
@@ -0,0 +1,215 @@
+"""
+TD-Gammon style position evaluator: a small NumPy MLP, CPU only.
+
+Boards use the engine layout (Game.pieces points plus bar counts, see
+engine.Position.board()) and are always evaluated for the side on roll.
+The network outputs five probabilities for that side: win, win a gammon,
+win a backgammon, lose a gammon and lose a backgammon. Everything is
+batched, so scoring every candidate play of a roll is one matrix multiply.
+"""
+import math
+
+import numpy as np
+
+from batch import flip_boards
+from bearoff import POINTS
+from engine import CHECKERS, board_result, legal_plays
+
+INPUTS = 196
+OUTPUTS = 5
+WIN, WIN_GAMMON, WIN_BACKGAMMON, LOSE_GAMMON, LOSE_BACKGAMMON = range(OUTPUTS)
+
+
+def _pair_table():
+    units = np.zeros((2 * CHECKERS + 1, 8), dtype=np.float32)
+    for n in range(-CHECKERS, CHECKERS + 1):
+        for offset, side in ((0, max(n, 0)), (4, max(-n, 0))):
+            units[n + CHECKERS, offset:offset + 4] = (side >= 1, side >= 2, side >= 3, max(side - 3, 0) / 2)
+    pairs = np.concatenate([np.repeat(units, len(units), axis=0), np.tile(units, (len(units), 1))], axis=1)
+    return np.ascontiguousarray(pairs).view("V64").reshape(-1)
+
+
+# the 16 units of every two neighbouring points, indexed by both signed
+# counts; gathering 64-byte records is far cheaper than computing them
+_PAIR_UNITS = _pair_table()
+_PAIR_STRIDE = 2 * CHECKERS + 1
+
+
+def encode(boards, players=1):
+    """
+    Feature vectors for an (N, 26) array of boards seen by the side on roll.
+
+    Each point gets four units per side (at least 1, 2 and 3 checkers, then
+    half of any extra), followed by bar counts / 2 and borne-off counts / 15
+    for both sides: 196 inputs in total.
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    black = np.broadcast_to(np.asarray(players), (len(boards),)) == -1
+    if black.any():
+        boards = boards.copy()
+        boards[black] = flip_boards(boards[black])
+    n = len(boards)
+    points = boards[:, :24].astype(np.intp) + CHECKERS
+    out = np.empty((n, INPUTS), dtype=np.float32)
+    out[:, :192] = np.take(_PAIR_UNITS, points[:, 0::2] * _PAIR_STRIDE + points[:, 1::2]).view(np.float32).reshape(n, 192)
+    bar = boards[:, 24:26]
+    out[:, 192:194] = bar / 2
+    own = np.maximum(boards[:, :24], 0).sum(1, dtype=np.intp)
+    opp = np.maximum(-boards[:, :24], 0).sum(1, dtype=np.intp)
+    out[:, 194] = (CHECKERS - own - bar[:, 0]) / CHECKERS
+    out[:, 195] = (CHECKERS - opp - bar[:, 1]) / CHECKERS
+    return out
+
+
+# math.comb(p, k) for every p and k bearoff.layout_index() can ask for
+_COMB = np.array([[math.comb(p, k) for k in range(POINTS + 1)] for p in range(CHECKERS + POINTS + 1)], dtype=np.intp)
+
+
+def _layout_indices(layouts):
+    """bearoff.layout_index() of every row of an (N, 6) array of home layouts."""
+    positions = np.cumsum(layouts + 1, axis=1) - 1
+    return _COMB[positions, np.arange(1, POINTS + 1)].sum(1)
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def invert(probs):
+    """Turn probabilities for one side into probabilities for the other."""
+    out = np.empty_like(probs)
+    out[:, WIN] = 1 - probs[:, WIN]
+    out[:, WIN_GAMMON] = probs[:, LOSE_GAMMON]
+    out[:, WIN_BACKGAMMON] = probs[:, LOSE_BACKGAMMON]
+    out[:, LOSE_GAMMON] = probs[:, WIN_GAMMON]
+    out[:, LOSE_BACKGAMMON] = probs[:, WIN_BACKGAMMON]
+    return out
+
+
+def equity(probs):
+    """Cubeless equity in points of each row of probabilities."""
+    probs = np.asarray(probs)
+    return (2 * probs[..., WIN] - 1 + probs[..., WIN_GAMMON] - probs[..., LOSE_GAMMON]
+            + probs[..., WIN_BACKGAMMON] - probs[..., LOSE_BACKGAMMON])
+
+
+def result_probs(points):
+    """Exact output vector for a finished game won (points > 0) or lost by the side."""
+    won = abs(points)
+    probs = np.array([1.0, won >= 2, won >= 3, 0.0, 0.0], dtype=np.float32)
+    return probs if points > 0 else invert(probs[None])[0]
+
+
+class Evaluator:
+    """
+    Args:
+        weights: dict (or .npz mapping) with W1, b1, W2, b2; random weights
+            seeded with `seed` when omitted.
+        hidden: hidden units for random weights.
+        bearoff: optional bearoff.BearoffDatabase used for the win chance of
+            pure bear-off races where no gammon is possible any more.
+    """
+
+    def __init__(self, weights=None, hidden=80, seed=0, bearoff=None):
+        if weights is None:
+            rng = np.random.default_rng(seed)
+            weights = {
+                "W1": rng.normal(0, 1 / np.sqrt(INPUTS), (INPUTS, hidden)),
+                "b1": np.zeros(hidden),
+                "W2": rng.normal(0, 1 / np.sqrt(hidden), (hidden, OUTPUTS)),
+                "b2": np.zeros(OUTPUTS),
+            }
+        self.W1 = np.asarray(weights["W1"], dtype=np.float32)
+        self.b1 = np.asarray(weights["b1"], dtype=np.float32)
+        self.W2 = np.asarray(weights["W2"], dtype=np.float32)
+        self.b2 = np.asarray(weights["b2"], dtype=np.float32)
+        self.bearoff = bearoff
+
+    @classmethod
+    def load(cls, path, bearoff=None):
+        with np.load(path) as weights:
+            return cls(dict(weights), bearoff=bearoff)
+
+    def save(self, path):
+        np.savez(path, W1=self.W1, b1=self.b1, W2=self.W2, b2=self.b2)
+
+    def weights(self):
+        return {"W1": self.W1, "b1": self.b1, "W2": self.W2, "b2": self.b2}
+
+    def forward(self, inputs):
+        """Hidden activations and raw outputs for an (N, INPUTS) batch."""
+        hidden = _sigmoid(inputs @ self.W1 + self.b1)
+        return hidden, _sigmoid(hidden @ self.W2 + self.b2)
+
+    def evaluate(self, boards, players=1):
+        """
+        Probabilities for the side on roll of every board.
+
+        Args:
+            boards: (N, 26) boards.
+            players: side on roll, scalar or (N,).
+
+        Returns:
+            (N, 5) float32 array, see the module docstring for the order.
+        """
+        boards = np.asarray(boards, dtype=np.int8)
+        probs = self.forward(encode(boards, players))[1]
+        # gammons can't be likelier than wins, nor backgammons than gammons
+        np.minimum(probs[:, WIN_GAMMON], probs[:, WIN], out=probs[:, WIN_GAMMON])
+        np.minimum(probs[:, WIN_BACKGAMMON], probs[:, WIN_GAMMON], out=probs[:, WIN_BACKGAMMON])
+        np.minimum(probs[:, LOSE_GAMMON], 1 - probs[:, WIN], out=probs[:, LOSE_GAMMON])
+        np.minimum(probs[:, LOSE_BACKGAMMON], probs[:, LOSE_GAMMON], out=probs[:, LOSE_BACKGAMMON])
+        if self.bearoff is not None:
+            self._apply_bearoff(boards, np.broadcast_to(np.asarray(players), (len(boards),)), probs)
+        return probs
+
+    def _apply_bearoff(self, boards, players, probs):
+        """BearoffDatabase.win_probability() for every row it covers, as array operations."""
+        points = boards[:, :24]
+        white = np.maximum(points, 0)
+        black = np.maximum(-points, 0)
+        white_left = white.sum(1)
+        black_left = black.sum(1)
+        # both sides home with nothing on the bar, and both have borne a
+        # checker off, so only single games remain; a database built for
+        # fewer checkers leaves the rest to the network
+        race = ((white[:, POINTS:].sum(1) == 0) & (black[:, :24 - POINTS].sum(1) == 0)
+                & (boards[:, 24] == 0) & (boards[:, 25] == 0)
+                & (white_left < CHECKERS) & (black_left < CHECKERS)
+                & (white_left <= self.bearoff.checkers) & (black_left <= self.bearoff.checkers))
+        rows = np.flatnonzero(race)
+        if not len(rows):
+            return
+        white_home = white[rows, :POINTS]
+        black_home = black[rows, :24 - POINTS - 1:-1]
+        on_roll = (players[rows] == 1)[:, None]
+        table = np.frombuffer(self.bearoff._table, dtype=np.uint16).reshape(-1, self.bearoff.max_rolls)
+        mine = table[_layout_indices(np.where(on_roll, white_home, black_home))] / 65535
+        theirs = table[_layout_indices(np.where(on_roll, black_home, white_home))] / 65535
+        # the side on roll wins ties: it wins in k rolls if the opponent needs k or more
+        at_least = 1 - np.cumsum(theirs, axis=1) + theirs
+        probs[rows] = 0
+        probs[rows, WIN] = (mine * at_least).sum(1)
+
+    def evaluate_plays(self, board, player, d1, d2):
+        """
+        All plays of a roll with their probabilities for the player making
+        them, scored in one batch. Returns (plays, probs).
+        """
+        plays = legal_plays(board, player, d1, d2)
+        boards = np.array([b for _, b in plays], dtype=np.int8)
+        probs = invert(self.evaluate(boards, -player))
+        for i, (_, b) in enumerate(plays):
+            points = board_result(b, player)
+            if points:
+                probs[i] = result_probs(points)
+        return plays, probs
+
+    def best_play(self, board, player, d1, d2):
+        """The (moves, board) play with the highest cubeless equity."""
+        plays, probs = self.evaluate_plays(board, player, d1, d2)
+        return plays[int(np.argmax(equity(probs)))]
+
+    def policy(self, board, player):
+        """Score function with the rollout.heuristic signature."""
+        return float(equity(invert(self.evaluate(np.array([board], dtype=np.int8), -player)))[0])
@@ -0,0 +1,144 @@
+"""
+Matches played in a child process, so the Qt menu stays responsive while
+they run and several can be open at once.
+
+The child runs Game with its own pygame window and, when it ends, sends
+the scoreboard points back over a pipe. The menu polls it (from a QTimer)
+and writes the scoreboard itself, so matches finishing together don't race
+on scoreboard.csv.
+
+    match = MatchProcess(("Alice", "Computer"), points=5, computer=True)
+    ...
+    if match.poll() and match.result is not None:
+        update_scoreboard("scoreboard.csv", match.player_names, match.result)
+"""
+import multiprocessing
+import sys
+
+
+def _play(conn, player_names, points, audio_on, computer):
+    from assets import assets
+
+    # this process starts with an empty asset cache: decode the match's
+    # images while pygame and the bot's worker start up
+    assets.preload()
+    # imported here: the menu process never needs pygame
+    from Game import Game
+    from bot import Bot
+
+    game = None
+    try:
+        # the computer always takes the second seat, black
+        bot = Bot(-1) if computer else None
+        game = Game(None, player_names, points, [0, 0], audio_on=audio_on, bot=bot, scoreboard=None)
+        game.run()
+        if game.game_over and game.result is None:
+            # game_over is only set once the match is won
+            print(f"match {player_names[0]} v {player_names[1]} ended without a result", file=sys.stderr)
+    finally:
+        # a match that was won still counts if something failed afterwards
+        conn.send(game.result if game is not None else None)
+        conn.close()
+
+
+class MatchProcess:
+    """
+    Args:
+        player_names: (white, black).
+        points: match length.
+        audio_on: play sounds.
+        computer: the bot plays black.
+    """
+
+    def __init__(self, player_names, points, audio_on=True, computer=False):
+        self.player_names = tuple(player_names)
+        self.finished = False
+        self.result = None
+        # spawn rather than fork: the parent runs Qt
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe(duplex=False)
+        self.process = context.Process(target=_play, args=(child_conn, self.player_names, points, audio_on, computer),
+                                       name=f"match {self.player_names[0]} v {self.player_names[1]}")
+        self.process.start()
+        # keep only the child's copy, so a crash shows up here as end of file
+        child_conn.close()
+
+    def poll(self):
+        """
+        Whether the match is over, without blocking. Once it is, result is
+        the (white, black) scoreboard points, or None if the window was
+        closed before the end.
+        """
+        if not self.finished and self._conn.poll():
+            try:
+                self.result = self._conn.recv()
+            except EOFError:
+                pass
+            self.finished = True
+            self._conn.close()
+        return self.finished
+
+
+def update_scoreboard(filename: str, players: list[str], score: list[int]):
+    import csv
+    import os
+
+    players = list(players)
+    score = list(score)
+
+    if not os.path.exists(filename):
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([""] + players)
+            for p in players:
+                writer.writerow([p] + [""] * len(players))
+
+    with open(filename, 'r', newline='') as f:
+        reader = list(csv.reader(f))
+
+    if not reader or not reader[0]:
+        raise ValueError("CSV file is malformed or empty")
+
+    headers = reader[0]
+    rows_dict = {row[0]: row for row in reader[1:]}
+
+    for player in players:
+        if player not in headers:
+            headers.append(player)
+            for row in rows_dict.values():
+                row.append("")
+            new_row = [player] + [""] * (len(headers) - 1)
+            rows_dict[player] = new_row
+
+    full_rows = [headers]
+    for row_name in headers[1:]:
+        if row_name not in rows_dict:
+            rows_dict[row_name] = [row_name] + [""] * (len(headers) - 1)
+        else:
+            row = rows_dict[row_name]
+            if len(row) < len(headers):
+                row += [""] * (len(headers) - len(row))
+            rows_dict[row_name] = row
+        full_rows.append(rows_dict[row_name])
+
+    p1, p2 = players
+    i = headers.index(p1)
+    j = headers.index(p2)
+
+    cell_val = rows_dict[p1][j]
+    if cell_val:
+        try:
+            existing = eval(cell_val)
+            new_score = [int(existing[0]) + int(score[0]), int(existing[1]) + int(score[1])]
+        except Exception:
+            new_score = score
+    else:
+        new_score = score
+
+    rows_dict[p1][j] = str(new_score)
+
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for row_name in headers[1:]:
+            writer.writerow(rows_dict[row_name])
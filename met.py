@@ -0,0 +1,179 @@
+"""
+Match equity tables.
+
+The match winning chance of a player needing `a` points against one
+needing `b` is computed by dynamic programming over the outcome of each game
+between equal players, from the share of games that end in a gammon or
+backgammon:
+
+- games before anyone is 1-away are valued cubeless, one point per win;
+- the Crawford game (the first game after a side reaches 1-away) is played
+  without the cube;
+- in post-Crawford games the trailer doubles at once and the leader takes,
+  so every game counts double for the trailer.
+
+Without the Crawford rule every game with a side at 1-away is played like
+a post-Crawford game. The tables for both rules are written to one small
+file that is opened with mmap, so loading it is a syscall and lookups are
+a multiply and an index.
+
+    python met.py [path]
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+MAX_AWAY = 25
+GAMMON_RATE = 0.26
+BACKGAMMON_RATE = 0.01
+MAGIC = b"BGME"
+HEADER = struct.Struct("<4sHHdd")
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "met.bin")
+
+
+def outcomes(gammon_rate=GAMMON_RATE, backgammon_rate=BACKGAMMON_RATE):
+    """(points, probability) of one side winning a game, for equal players."""
+    return [(1, 0.5 * (1 - gammon_rate)), (2, 0.5 * (gammon_rate - backgammon_rate)), (3, 0.5 * backgammon_rate)]
+
+
+def build(max_away=MAX_AWAY, gammon_rate=GAMMON_RATE, backgammon_rate=BACKGAMMON_RATE):
+    """
+    Compute the tables; returns (crawford, no_crawford, crawford_game,
+    post_crawford) as flat arrays.
+
+    The first two are (max_away + 1) ** 2 pre-game equities for a player
+    a-away against b-away, indexed a * (max_away + 1) + b. The last two hold
+    the leader's equity at 1-away against b-away in the Crawford game and in
+    post-Crawford games.
+    """
+    wins = outcomes(gammon_rate, backgammon_rate)
+    size = max_away + 1
+    # post-Crawford: the trailer's cube turns every win into twice the points
+    post = [0.0] * size
+    for b in range(1, size):
+        post[b] = 0.5 + sum(p * post[max(b - 2 * k, 0)] for k, p in wins)
+    craw = [0.0] * size
+    craw[1] = 0.5
+    for b in range(2, size):
+        craw[b] = 0.5 + sum(p * post[max(b - k, 0)] for k, p in wins)
+
+    tables = []
+    for one_away in (craw, post):
+        def after(a, b):
+            if a <= 0:
+                return 1.0
+            if b <= 0:
+                return 0.0
+            if a == 1:
+                return one_away[b]
+            if b == 1:
+                return 1 - one_away[a]
+            return table[a * size + b]
+
+        table = [0.0] * (size * size)
+        for total in range(2, 2 * size):
+            for a in range(max(1, total - max_away), min(total, size)):
+                b = total - a
+                if a == 1 or b == 1:
+                    continue
+                # every outcome lowers a or b, so it is already in the table
+                table[a * size + b] = sum(p * (after(a - k, b) + after(a, b - k)) for k, p in wins)
+        # lookups at 1-away are post-Crawford unless asked for the Crawford game
+        for b in range(1, size):
+            table[size + b] = post[b]
+            table[b * size + 1] = 1 - post[b]
+        tables.append(array("d", table))
+    return tables[0], tables[1], array("d", craw), array("d", post)
+
+
+def write(path=DEFAULT_PATH, max_away=MAX_AWAY, gammon_rate=GAMMON_RATE, backgammon_rate=BACKGAMMON_RATE):
+    tables = build(max_away, gammon_rate, backgammon_rate)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 1, max_away, gammon_rate, backgammon_rate))
+        for table in tables:
+            table.tofile(f)
+    os.replace(tmp, path)
+
+
+class MatchEquityTable:
+    """
+    Read-only view of a file written by write().
+
+    Args:
+        path: table file.
+        crawford: whether matches use the Crawford rule.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, crawford=True):
+        self.path = path
+        self.crawford = crawford
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_away, self.gammon_rate, self.backgammon_rate = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != 1:
+            raise ValueError(f"{path} is not a match equity table")
+        self._size = size = self.max_away + 1
+        view = memoryview(self._mmap)[HEADER.size:HEADER.size + (2 * size * size + 2 * size) * 8].cast("d")
+        self._table = view[:size * size] if crawford else view[size * size:2 * size * size]
+        self._crawford_game = view[2 * size * size:2 * size * size + size]
+
+    def __reduce__(self):
+        return type(self), (self.path, self.crawford)
+
+    def close(self):
+        self._table.release()
+        self._crawford_game.release()
+        self._mmap.close()
+
+    def equity(self, away, opponent_away, crawford_game=False):
+        """
+        Chance of winning the match for a player `away` points from winning
+        against one `opponent_away` points away, before the next game.
+        `crawford_game` says whether that game is the Crawford game (only
+        meaningful when a side is 1-away); otherwise it is post-Crawford.
+        """
+        if away <= 0:
+            return 1.0
+        if opponent_away <= 0:
+            return 0.0
+        if crawford_game and self.crawford:
+            if away == 1 and opponent_away > 1:
+                return self._crawford_game[opponent_away]
+            if opponent_away == 1 and away > 1:
+                return 1 - self._crawford_game[away]
+        return self._table[away * self._size + opponent_away]
+
+    def __getitem__(self, score):
+        return self.equity(*score)
+
+
+def load(path=DEFAULT_PATH, crawford=True, max_away=MAX_AWAY, gammon_rate=GAMMON_RATE, backgammon_rate=BACKGAMMON_RATE):
+    """
+    Open the table at path, (re)building it first if it is missing or was
+    made for other settings.
+    """
+    try:
+        table = MatchEquityTable(path, crawford)
+        if (table.max_away, table.gammon_rate, table.backgammon_rate) == (max_away, gammon_rate, backgammon_rate):
+            return table
+        table.close()
+    except (OSError, ValueError, struct.error):
+        pass
+    write(path, max_away, gammon_rate, backgammon_rate)
+    return MatchEquityTable(path, crawford)
+
+
+if __name__ == "__main__":
+    import time
+
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    write(path)
+    start = time.perf_counter()
+    table = MatchEquityTable(path)
+    print(f"loaded in {(time.perf_counter() - start) * 1e6:.0f} µs")
+    print("     " + "".join(f"{b:>7}" for b in range(1, 12)))
+    for a in range(1, 12):
+        print(f"{a:>3}  " + "".join(f"{table.equity(a, b) * 100:7.1f}" for b in range(1, 12)))
@@ -0,0 +1,266 @@
+"""
+GNU Backgammon Position IDs and Match IDs.
+
+A Position ID is 14 base64 characters for an 80-bit key. For the player on
+roll and then the opponent, each of their points 1 to 24 (counted from
+their own side) and then their bar contributes as many 1 bits as checkers
+followed by a 0; the bits are packed least significant first into 10 bytes.
+The key only says "player on roll" and "opponent", so decoding one needs
+to know who is on roll, which the Match ID carries.
+
+A Match ID is 12 characters for a 66-bit field, least significant first:
+
+    bits  0-3   log2 of the cube value
+          4-5   cube owner: 0 player 0, 1 player 1, 3 centered
+          6     player on roll
+          7     Crawford game
+          8-10  game state (see PLAYING and friends)
+          11    player to make a decision
+          12    double offered
+          13-14 resignation offered (1, 2 or 3 points)
+          15-17 first die, 0 if not rolled
+          18-20 second die
+          21-35 match length, 0 for money play
+          36-50 player 0's score
+          51-65 player 1's score
+
+Player 0 is white (player 1 here, Game.player_names[0]) and player 1 is
+black. Both IDs are packed as one Python int: the Position ID from a string
+of unary codes through int(s, 2), and decoding with one str.split(). The
+points are packed four to a u32 by struct, and each u32 maps to the codes
+of its four points through a table filled as they come up. So encoding
+does six lookups per side, not 24.
+
+    python positionid.py 4HPwATDgc/ABMA [cAkAAAAAAAAA]
+"""
+import base64
+import binascii
+import struct
+import sys
+
+from engine import CHECKERS
+
+NO_GAME, PLAYING, GAME_OVER, RESIGNED, DROPPED = range(5)
+CENTERED_OWNER = 3
+
+# Unary codes written most significant bit first, so the whole string read
+# by int(s, 2) puts the first checker of the key in bit 0. Indexed by the
+# signed count on a point; negative counts wrap around to the end.
+_CODES = ["0" + "1" * n for n in range(CHECKERS + 1)]
+_WHITE = _CODES + ["0"] * CHECKERS
+_BLACK = ["0"] * (CHECKERS + 1) + _CODES[:0:-1]
+_join = "".join
+
+
+class _Chunks(dict):
+    """
+    The codes of four points, keyed by their counts as the bytes of a
+    little-endian u32, for one side: black's in board order, white's
+    reversed. Filled on first use; there are far too many to build up
+    front and a game only meets a few thousand.
+    """
+
+    LIMIT = 1 << 15
+
+    def __init__(self, codes, reverse):
+        super().__init__()
+        self.codes = codes
+        self.reverse = reverse
+
+    def __missing__(self, key):
+        counts = [n - 256 if n > CHECKERS else n for n in key.to_bytes(4, "little")]
+        if self.reverse:
+            counts.reverse()
+        if len(self) >= self.LIMIT:
+            self.clear()
+        bits = self[key] = _join([self.codes[n] for n in counts])
+        return bits
+
+
+_black_chunk = _Chunks(_BLACK, False).__getitem__
+_white_chunk = _Chunks(_WHITE, True).__getitem__
+_pack_board = struct.Struct("<26b").pack
+_point_words = struct.Struct("<6I2x").unpack
+
+
+def position_key(board, player):
+    """The 80-bit key of a 26-entry board with `player` on roll."""
+    words = _point_words(_pack_board(*board))
+    if player == 1:
+        bits = (_CODES[board[25]] + _join(map(_black_chunk, words))
+                + _CODES[board[24]] + _join(map(_white_chunk, reversed(words))))
+    else:
+        bits = (_CODES[board[24]] + _join(map(_white_chunk, reversed(words)))
+                + _CODES[board[25]] + _join(map(_black_chunk, words)))
+    return int(bits, 2)
+
+
+def position_id(board, player):
+    """The Position ID of a 26-entry board with `player` (1 or -1) on roll."""
+    return binascii.b2a_base64(position_key(board, player).to_bytes(10, "little"), newline=False)[:14].decode()
+
+
+def decode_position_id(position_id, player=1):
+    """
+    The 26-entry board of a Position ID, with `player` on roll.
+
+    Raises:
+        ValueError: for a string that is not a valid Position ID.
+    """
+    try:
+        data = base64.b64decode(position_id + "==", validate=True)
+    except ValueError:
+        raise ValueError(f"invalid position ID {position_id!r}") from None
+    if len(position_id) != 14 or len(data) != 10:
+        raise ValueError(f"invalid position ID {position_id!r}")
+    bits = format(int.from_bytes(data, "little"), "080b")[::-1]
+    counts = [len(run) for run in bits.split("0", 50)[:50]]
+    mine, theirs = counts[:25], counts[25:]
+    if len(counts) < 50 or sum(mine) > CHECKERS or sum(theirs) > CHECKERS:
+        raise ValueError(f"invalid position ID {position_id!r}")
+    white, black = (mine, theirs) if player == 1 else (theirs, mine)
+    # white's point n is index n - 1, black's is index 24 - n
+    board = [w - b for w, b in zip(white[:24], black[23::-1])]
+    if any(w and b for w, b in zip(white[:24], black[23::-1])):
+        raise ValueError(f"invalid position ID {position_id!r}")
+    return tuple(board) + (white[24], black[24])
+
+
+class MatchState:
+    """
+    The fields of a Match ID, with players as 1 (white) and -1 (black).
+
+    Args:
+        player: the player on roll.
+        dice: (d1, d2), (0, 0) before rolling.
+        score: (white, black).
+        length: match length, 0 for money play.
+        cube: cube value.
+        owner: 1 or -1 for the player holding the cube, 0 when centered.
+        crawford: whether this is the Crawford game.
+        state: NO_GAME, PLAYING, GAME_OVER, RESIGNED or DROPPED.
+        turn: the player to make a decision, the player on roll if None.
+        double_offered: whether a double is waiting to be answered.
+        resignation: points of a resignation on offer, 0 for none.
+    """
+
+    def __init__(self, player, dice=(0, 0), score=(0, 0), length=0, cube=1, owner=0, crawford=False,
+                 state=PLAYING, turn=None, double_offered=False, resignation=0):
+        self.player = player
+        self.dice = tuple(dice)
+        self.score = tuple(score)
+        self.length = length
+        self.cube = cube
+        self.owner = owner
+        self.crawford = crawford
+        self.state = state
+        self.turn = player if turn is None else turn
+        self.double_offered = double_offered
+        self.resignation = resignation
+
+    def _fields(self):
+        return (self.player, self.dice, self.score, self.length, self.cube, self.owner, self.crawford,
+                self.state, self.turn, self.double_offered, self.resignation)
+
+    def __eq__(self, other):
+        return isinstance(other, MatchState) and self._fields() == other._fields()
+
+    def __repr__(self):
+        return (f"MatchState(player={self.player}, dice={self.dice}, score={self.score}, length={self.length}, "
+                f"cube={self.cube}, owner={self.owner}, crawford={self.crawford}, state={self.state}, "
+                f"turn={self.turn}, double_offered={self.double_offered}, resignation={self.resignation})")
+
+
+def match_id(state):
+    """The Match ID of a MatchState."""
+    key = ((state.cube.bit_length() - 1)
+           | (CENTERED_OWNER if not state.owner else state.owner == -1) << 4
+           | (state.player == -1) << 6
+           | bool(state.crawford) << 7
+           | state.state << 8
+           | (state.turn == -1) << 11
+           | bool(state.double_offered) << 12
+           | state.resignation << 13
+           | state.dice[0] << 15
+           | state.dice[1] << 18
+           | state.length << 21
+           | state.score[0] << 36
+           | state.score[1] << 51)
+    return base64.b64encode(key.to_bytes(9, "little")).decode()
+
+
+def decode_match_id(match_id):
+    """
+    The MatchState of a Match ID.
+
+    Raises:
+        ValueError: for a string that is not a valid Match ID.
+    """
+    try:
+        data = base64.b64decode(match_id, validate=True)
+    except ValueError:
+        raise ValueError(f"invalid match ID {match_id!r}") from None
+    if len(match_id) != 12 or len(data) != 9:
+        raise ValueError(f"invalid match ID {match_id!r}")
+    key = int.from_bytes(data, "little")
+    owner = key >> 4 & 3
+    dice = (key >> 15 & 7, key >> 18 & 7)
+    if owner == 2 or key >> 8 & 7 > DROPPED or not all(d <= 6 for d in dice) or (0 in dice) != (dice == (0, 0)):
+        raise ValueError(f"invalid match ID {match_id!r}")
+    return MatchState(
+        player=-1 if key >> 6 & 1 else 1,
+        dice=dice,
+        score=(key >> 36 & 0x7FFF, key >> 51 & 0x7FFF),
+        length=key >> 21 & 0x7FFF,
+        cube=1 << (key & 15),
+        owner=0 if owner == CENTERED_OWNER else (-1 if owner else 1),
+        crawford=bool(key >> 7 & 1),
+        state=key >> 8 & 7,
+        turn=-1 if key >> 11 & 1 else 1,
+        double_offered=bool(key >> 12 & 1),
+        resignation=key >> 13 & 3,
+    )
+
+
+if __name__ == "__main__":
+    import time
+
+    from engine import START
+
+    if len(sys.argv) > 1:
+        state = decode_match_id(sys.argv[2]) if len(sys.argv) > 2 else None
+        board = decode_position_id(sys.argv[1], state.player if state else 1)
+        print("points:", list(board[:24]))
+        print("bar:", list(board[24:]))
+        if state:
+            print(state)
+    else:
+        import random
+
+        from engine import board_result, legal_plays
+
+        n = 200000
+        board = START + (0, 0)
+        start = time.perf_counter()
+        for _ in range(n):
+            position_id(board, 1)
+        elapsed = time.perf_counter() - start
+        print(f"{position_id(board, 1)}: {n / elapsed:,.0f} encodes/s")
+        # positions from random games, each met once per pass
+        rng = random.Random(0)
+        boards = []
+        while len(boards) < 10000:
+            board, player = START + (0, 0), 1
+            while not board_result(board, -player):
+                boards.append((board, player))
+                board = rng.choice(legal_plays(board, player, rng.randint(1, 6), rng.randint(1, 6)))[1]
+                player = -player
+        start = time.perf_counter()
+        for _ in range(n // len(boards)):
+            for board, player in boards:
+                position_id(board, player)
+        print(f"{n / (time.perf_counter() - start):,.0f} encodes/s over {len(boards)} game positions")
+        start = time.perf_counter()
+        for _ in range(n):
+            decode_position_id("4HPwATDgc/ABMA")
+        print(f"{n / (time.perf_counter() - start):,.0f} decodes/s")
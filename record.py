@@ -0,0 +1,470 @@
+"""
+Match records: a compact binary archive and the text .mat format.
+
+A record file is the magic b"BGR2" followed by length-prefixed records (the
+length is an unsigned LEB128 varint). A match record holds the players,
+match length and dice seed; each of its games is one game record after it,
+carrying the match's random id, since matches played side by side append
+to the same file and their records interleave:
+
+    match: 0x01, u64 id, u16 length, u64 seed, then two names as u8 length
+           + UTF-8
+    game:  0x02, u64 match id, u16 white score, u16 black score, u8 winner
+           (0 unfinished, 1 white, 2 black), u8 points, then the game's events
+
+Events take one or two bytes:
+
+    0x00-0x23   white rolls, (d1 - 1) * 6 + d2 - 1
+    0x40-0x63   black rolls, same encoding
+    0x30 0x31 0x32  double, take, drop
+    0x80 | hi, lo   checker move, (piece + 1) * 26 + target + 1 in ten bits
+
+Pieces and targets are Game indices (entry points 24 / -1, bear-offs to
+-1 / 24, see engine.entry_point and off_point). RecordWriter only touches
+the file from a background thread, so recording never stalls the frame
+loop; read_games() streams games one record at a time.
+
+    python record.py export matches.bgr > matches.mat
+    python record.py import match.mat matches.bgr
+"""
+import os
+import queue
+import random
+import re
+import struct
+import sys
+import threading
+
+from engine import Position, entry_point, off_point
+
+MAGIC = b"BGR2"
+MATCH = 0x01
+GAME = 0x02
+DOUBLE, TAKE, DROP = 0x30, 0x31, 0x32
+BLACK_ROLL = 0x40
+MOVE = 0x80
+_MATCH_HEADER = struct.Struct("<BQHQ")
+_GAME_HEADER = struct.Struct("<BQHHBB")
+
+
+class MatchInfo:
+    """
+    Args:
+        players: (white, black) names.
+        length: match length.
+        seed: seed of the match's dice.
+        id: tells the match's games from others in the same file; random
+            if None. Not part of equality.
+    """
+
+    def __init__(self, players, length, seed=0, id=None):
+        self.players = tuple(players)
+        self.length = length
+        self.seed = seed
+        self.id = random.getrandbits(64) if id is None else id
+
+    def __eq__(self, other):
+        return (self.players, self.length, self.seed) == (other.players, other.length, other.seed)
+
+    def __repr__(self):
+        return f"MatchInfo({self.players}, length={self.length}, seed={self.seed})"
+
+
+class GameRecord:
+    """
+    One game. Events are ("roll", player, d1, d2), ("move", piece, target),
+    ("double",), ("take",) and ("drop",); winner is 1, -1 or 0 if the game
+    was not finished.
+    """
+
+    def __init__(self, match, score=(0, 0), events=(), winner=0, points=0):
+        self.match = match
+        self.score = tuple(score)
+        self.events = list(events)
+        self.winner = winner
+        self.points = points
+
+    def __eq__(self, other):
+        return (self.match, self.score, self.events, self.winner, self.points) == \
+            (other.match, other.score, other.events, other.winner, other.points)
+
+    def __repr__(self):
+        return f"GameRecord(score={self.score}, events={len(self.events)}, winner={self.winner}, points={self.points})"
+
+
+def _varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def encode_match(match):
+    out = bytearray(_MATCH_HEADER.pack(MATCH, match.id, match.length, match.seed))
+    for name in match.players:
+        name = name.encode()[:255]
+        out.append(len(name))
+        out += name
+    return bytes(out)
+
+
+def encode_game(game):
+    winner = {0: 0, 1: 1, -1: 2}[game.winner]
+    out = bytearray(_GAME_HEADER.pack(GAME, game.match.id, game.score[0], game.score[1], winner, game.points))
+    for event in game.events:
+        kind = event[0]
+        if kind == "roll":
+            _, player, d1, d2 = event
+            out.append((d1 - 1) * 6 + d2 - 1 + (BLACK_ROLL if player == -1 else 0))
+        elif kind == "move":
+            code = (event[1] + 1) * 26 + event[2] + 1
+            out += bytes((MOVE | code >> 8, code & 0xFF))
+        else:
+            out.append({"double": DOUBLE, "take": TAKE, "drop": DROP}[kind])
+    return bytes(out)
+
+
+def decode_match(data):
+    _, id, length, seed = _MATCH_HEADER.unpack_from(data)
+    names = []
+    i = _MATCH_HEADER.size
+    for _ in range(2):
+        n = data[i]
+        names.append(bytes(data[i + 1:i + 1 + n]).decode())
+        i += 1 + n
+    return MatchInfo(names, length, seed, id)
+
+
+_CUBE = {DOUBLE: ("double",), TAKE: ("take",), DROP: ("drop",)}
+
+
+def game_match_id(data):
+    """The id of the match a raw game record belongs to."""
+    return _GAME_HEADER.unpack_from(data)[1]
+
+
+def decode_game(data, match=None):
+    _, _, white, black, winner, points = _GAME_HEADER.unpack_from(data)
+    events = []
+    i = _GAME_HEADER.size
+    end = len(data)
+    while i < end:
+        op = data[i]
+        if op & MOVE:
+            code = (op & 0x7F) << 8 | data[i + 1]
+            events.append(("move", code // 26 - 1, code % 26 - 1))
+            i += 2
+            continue
+        if op in _CUBE:
+            events.append(_CUBE[op])
+        else:
+            player = -1 if op & BLACK_ROLL else 1
+            roll = op & 0x3F
+            events.append(("roll", player, roll // 6 + 1, roll % 6 + 1))
+        i += 1
+    return GameRecord(match, (white, black), events, (0, 1, -1)[winner], points)
+
+
+def read_records(path):
+    """Yield the raw (type, payload) of every record in a file, one at a time."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a match record file")
+        while True:
+            length = shift = 0
+            while True:
+                byte = f.read(1)
+                if not byte:
+                    if shift:
+                        raise ValueError(f"{path} ends inside a record length")
+                    return
+                length |= (byte[0] & 0x7F) << shift
+                shift += 7
+                if byte[0] < 0x80:
+                    break
+            payload = f.read(length)
+            if len(payload) < length:
+                # a record cut short by a crash; everything before it is intact
+                return
+            yield payload[0], payload
+
+
+def read_games(path):
+    """
+    Yield every GameRecord in a file in the order they were written, each
+    with its match's MatchInfo (the same object for all games of a match).
+    """
+    matches = {}
+    for kind, payload in read_records(path):
+        if kind == MATCH:
+            match = decode_match(payload)
+            matches[match.id] = match
+        elif kind == GAME:
+            yield decode_game(payload, matches.get(game_match_id(payload)))
+
+
+def _create(path):
+    """Create a record file holding just the magic, unless it exists."""
+    if os.path.exists(path):
+        return
+    # written aside and linked into place, so that of two writers starting
+    # together only one magic lands and neither appends to a file without it
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(MAGIC)
+    try:
+        os.link(temp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temp)
+
+
+def write_games(path, games):
+    """Append GameRecords to a record file, with a match record before each match's first game."""
+    _create(path)
+    with open(path, "ab") as f:
+        written = set()
+        for game in games:
+            if game.match.id not in written:
+                record = encode_match(game.match)
+                f.write(_varint(len(record)) + record)
+                written.add(game.match.id)
+            record = encode_game(game)
+            f.write(_varint(len(record)) + record)
+
+
+class RecordWriter:
+    """
+    Append-only writer for one match. Events are collected in memory as they
+    happen; finished records go to a background thread that appends them to
+    the file, so no call ever waits for the disk.
+
+    Args:
+        path: record file, created with the magic if it does not exist.
+        players: (white, black) names.
+        length: match length.
+        seed: seed of the match's dice, to replay it.
+    """
+
+    def __init__(self, path, players, length, seed=0):
+        self.match = MatchInfo(players, length, seed)
+        self.game = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write, args=(path,), daemon=True)
+        self._thread.start()
+        self._queue.put(encode_match(self.match))
+
+    def _write(self, path):
+        _create(path)
+        with open(path, "ab") as f:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                f.write(_varint(len(record)) + record)
+                f.flush()
+
+    def start_game(self, score):
+        """Start a new game at score (white, black); an unfinished one is kept as such."""
+        if self.game is not None:
+            self._queue.put(encode_game(self.game))
+        self.game = GameRecord(self.match, score)
+
+    def roll(self, player, d1, d2):
+        self.game.events.append(("roll", player, d1, d2))
+
+    def move(self, piece, target):
+        self.game.events.append(("move", piece, target))
+
+    def double(self):
+        self.game.events.append(("double",))
+
+    def take(self):
+        self.game.events.append(("take",))
+
+    def drop(self):
+        self.game.events.append(("drop",))
+
+    def end_game(self, winner, points):
+        """Finish the current game; does nothing if there is none."""
+        if self.game is None:
+            return
+        self.game.winner = winner
+        self.game.points = points
+        self._queue.put(encode_game(self.game))
+        self.game = None
+
+    def close(self):
+        if self.game is not None:
+            self._queue.put(encode_game(self.game))
+            self.game = None
+        self._queue.put(None)
+        self._thread.join()
+
+
+# Text .mat format. Points are numbered 1-24 from the mover's side, the bar is
+# 25 ("bar") and borne-off checkers go "off". The left column is wide enough
+# for four hitting moves; import_mat finds the columns from the game header.
+_COLUMN = 36
+
+def _point_name(player, index):
+    if index == entry_point(player):
+        return "bar"
+    if index == off_point(player):
+        return "off"
+    return str(index + 1 if player == 1 else 24 - index)
+
+
+def _point_index(player, name):
+    if name == "bar" or name == "25":
+        return entry_point(player)
+    if name == "off" or name == "0":
+        return off_point(player)
+    n = int(name)
+    return n - 1 if player == 1 else 24 - n
+
+
+def export_mat(games, file):
+    """Write GameRecords of one match to a text file object in .mat format."""
+    games = list(games)
+    if not games:
+        return
+    match = games[0].match
+    file.write(f" {match.length} point match\n")
+    for number, game in enumerate(games, 1):
+        file.write(f"\n Game {number}\n")
+        left = f" {match.players[0]} : {game.score[0]}"
+        file.write(f"{left:<{_COLUMN + 5}}{match.players[1]} : {game.score[1]}\n")
+        lines = [["", ""]]
+
+        def put(player, text):
+            line = lines[-1]
+            if (player == 1 and (line[0] or line[1])) or (player == -1 and line[1]):
+                line = ["", ""]
+                lines.append(line)
+            line[player == -1] = text
+
+        position = Position(current_player=1)
+        cube = 1
+        mover = doubler = 0
+        cell = None
+        for event in game.events:
+            kind = event[0]
+            if kind == "roll":
+                if cell is not None:
+                    put(mover, cell)
+                _, mover, d1, d2 = event
+                position.current_player = mover
+                position.set_dice(d1, d2)
+                cell = f"{d1}{d2}:"
+            elif kind == "move":
+                _, piece, target = event
+                hit = 0 <= target <= 23 and position.pieces[target] * mover == -1
+                position.play_move(piece, target)
+                cell += f" {_point_name(mover, piece)}/{_point_name(mover, target)}{'*' if hit else ''}"
+            else:
+                if cell is not None:
+                    put(mover, cell)
+                    cell = None
+                if kind == "double":
+                    doubler = -mover
+                    cube *= 2
+                    put(doubler, f" Doubles => {cube}")
+                else:
+                    put(-doubler, " Takes" if kind == "take" else " Drops")
+        if cell is not None:
+            put(mover, cell)
+        if game.winner:
+            put(game.winner, f" Wins {game.points} point{'s' if game.points != 1 else ''}")
+        if not lines[0][0] and not lines[0][1]:
+            lines.pop(0)
+        for i, (white, black) in enumerate(lines, 1):
+            file.write(f"{i:3d}) {white:<{_COLUMN}}{black}".rstrip() + "\n")
+
+
+_ROLL_CELL = re.compile(r"(\d)(\d):(.*)")
+_MOVE = re.compile(r"(\w+)((?:/\w+\*?)+)(?:\((\d)\))?")
+
+
+def _parse_cell(player, text, events):
+    text = text.strip()
+    if not text:
+        return None
+    match = _ROLL_CELL.match(text)
+    if match:
+        d1, d2 = int(match.group(1)), int(match.group(2))
+        events.append(("roll", player, d1, d2))
+        for token in match.group(3).split():
+            move = _MOVE.fullmatch(token.lower())
+            if not move:
+                raise ValueError(f"can't read move {token!r}")
+            points = [move.group(1)] + move.group(2).replace("*", "").split("/")[1:]
+            for _ in range(int(move.group(3) or 1)):
+                for a, b in zip(points, points[1:]):
+                    events.append(("move", _point_index(player, a), _point_index(player, b)))
+        return None
+    words = text.split()
+    if words[0] == "Doubles":
+        events.append(("double",))
+    elif words[0] == "Takes":
+        events.append(("take",))
+    elif words[0] in ("Drops", "Passes"):
+        events.append(("drop",))
+    elif words[0] == "Wins":
+        return player, int(words[1])
+    return None
+
+
+def import_mat(text):
+    """Read a .mat file's text; returns (MatchInfo, [GameRecord])."""
+    length = 0
+    games = []
+    match = None
+    split = _COLUMN + 5
+    game = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        found = re.match(r"(\d+) point match", stripped)
+        if found:
+            length = int(found.group(1))
+            continue
+        if re.match(r"Game \d+", stripped):
+            game = None
+            continue
+        header = re.match(r"\s*(.+?)\s*:\s*(\d+)\s+(.+?)\s*:\s*(\d+)\s*$", line)
+        if header and game is None:
+            if match is None:
+                match = MatchInfo((header.group(1), header.group(3)), length)
+            split = line.index(header.group(3), header.end(2))
+            game = GameRecord(match, (int(header.group(2)), int(header.group(4))))
+            games.append(game)
+            continue
+        numbered = re.match(r"\s*\d+\)", line)
+        if numbered and game is not None:
+            for player, cell in ((1, line[numbered.end():split]), (-1, line[split:])):
+                result = _parse_cell(player, cell, game.events)
+                if result:
+                    game.winner, game.points = result
+    return match, games
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "export":
+        matches = {}
+        for game in read_games(sys.argv[2]):
+            matches.setdefault(game.match.id, []).append(game)
+        for i, games in enumerate(matches.values()):
+            if i:
+                sys.stdout.write("\n")
+            export_mat(games, sys.stdout)
+    elif len(sys.argv) == 4 and sys.argv[1] == "import":
+        with open(sys.argv[2]) as f:
+            _, games = import_mat(f.read())
+        write_games(sys.argv[3], games)
+    else:
+        sys.exit("usage: python record.py export FILE.bgr | import FILE.mat FILE.bgr")
@@ -0,0 +1,233 @@
+"""
+Monte Carlo rollouts of a position to the end of the game.
+
+Games are played out in chunks spread over a ProcessPoolExecutor. Every chunk
+has its own seeded dice stream, and the first rolls of each block of 36 games
+are stratified so every one of the 36 dice combinations shows up exactly
+once per turn, which removes most of the luck of the opening rolls. Chunks
+smaller than 36 games split a block between them, so there are enough tasks
+to keep every worker busy. Results
+stream back chunk by chunk so the caller can stop as soon as the standard
+error is small enough.
+"""
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dicesource import StratifiedDice
+from engine import board_result, flip, legal_plays
+
+
+def heuristic(board, player):
+    """
+    Cheap score of a board for the player who just moved, used to pick plays
+    during rollouts. Higher is better.
+    """
+    b = board if player == 1 else flip(board)
+    own_pip = b[24] * 25
+    opp_pip = b[25] * 25
+    # opponent checkers move up the board, so they only threaten points above their last one
+    opp_back = -1 if b[25] else None
+    score = 0.0
+    for i in range(24):
+        v = b[i]
+        if v > 0:
+            own_pip += v * (i + 1)
+            if v >= 2:
+                score += 2.0 if i < 6 else 1.0
+        elif v < 0:
+            opp_pip -= v * (24 - i)
+            if opp_back is None:
+                opp_back = i
+    for i in range(24):
+        if b[i] == 1 and opp_back is not None and i > opp_back:
+            score -= 1.5 + i / 12
+    return score + (opp_pip - own_pip) / 4 + b[25] * 3.0
+
+
+def play_out(board, player, rolls, policy=heuristic):
+    """
+    Play a game to the end with `policy` choosing every play.
+
+    Args:
+        board: 26-entry board (engine.Position.board() layout).
+        player: side to roll first.
+        rolls: iterator of (d1, d2), e.g. a dicesource.DiceSource.
+
+    Returns:
+        Points won by the player who rolled first, negative if they lost.
+    """
+    first = player
+    while True:
+        d1, d2 = next(rolls)
+        plays = legal_plays(board, player, d1, d2)
+        if len(plays) == 1:
+            board = plays[0][1]
+        else:
+            board = max(plays, key=lambda play: policy(play[1], player))[1]
+        points = board_result(board, player)
+        if points:
+            return points if player == first else -points
+        player = -player
+
+
+def rollout_chunk(board, player, games, seed, quasi_turns=2, policy=heuristic, first=0):
+    """
+    Roll out `games` games in this process and return their results.
+    For the first `quasi_turns` turns, game i gets roll first + i (mod 36)
+    of a list of the 36 combinations shuffled by `seed`. Chunks that share a
+    seed but start at different `first` games draw different later rolls.
+    """
+    dice = StratifiedDice(seed, quasi_turns)
+    if first:
+        dice.random.seed(f"{seed}/{first}")
+    results = []
+    for i in range(first, first + games):
+        dice.start_game(i)
+        results.append(play_out(board, player, dice, policy))
+    return results
+
+
+class RolloutResult:
+    """
+    Running totals of a rollout from the point of view of the side that
+    rolls first. Probabilities are cumulative: `gammon` includes backgammons.
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.counts = {p: 0 for p in (3, 2, 1, -1, -2, -3)}
+        self.points = 0
+        self.points_squared = 0
+
+    def add(self, results):
+        for r in results:
+            self.counts[r] += 1
+            self.points += r
+            self.points_squared += r * r
+        self.games += len(results)
+
+    def _p(self, *outcomes):
+        return sum(self.counts[o] for o in outcomes) / self.games if self.games else 0.0
+
+    @property
+    def win(self):
+        return self._p(1, 2, 3)
+
+    @property
+    def gammon(self):
+        return self._p(2, 3)
+
+    @property
+    def backgammon(self):
+        return self._p(3)
+
+    @property
+    def lose_gammon(self):
+        return self._p(-2, -3)
+
+    @property
+    def lose_backgammon(self):
+        return self._p(-3)
+
+    @property
+    def equity(self):
+        """Cubeless equity in points per game."""
+        return self.points / self.games if self.games else 0.0
+
+    @property
+    def equity_se(self):
+        if self.games < 2:
+            return math.inf
+        variance = (self.points_squared - self.points ** 2 / self.games) / (self.games - 1)
+        return math.sqrt(max(variance, 0.0) / self.games)
+
+    def se(self, p):
+        """Standard error of a probability estimated from this many games."""
+        return math.sqrt(p * (1 - p) / self.games) if self.games else math.inf
+
+    def interval(self, p, z=1.96):
+        """Normal-approximation confidence interval of a probability (95% by default)."""
+        half = z * self.se(p)
+        return max(0.0, p - half), min(1.0, p + half)
+
+    def __repr__(self):
+        return (f"RolloutResult(games={self.games}, win={self.win:.4f}, gammon={self.gammon:.4f}, "
+                f"backgammon={self.backgammon:.4f}, lose_gammon={self.lose_gammon:.4f}, "
+                f"lose_backgammon={self.lose_backgammon:.4f}, equity={self.equity:+.4f} ± {self.equity_se:.4f})")
+
+
+def chunk_size(games, workers):
+    """
+    Games per task for about four tasks per worker: a multiple of 36, or a
+    divisor of 36 when there are fewer games than that per task, so the
+    stratified blocks of 36 games stay whole.
+    """
+    target = math.ceil(games / (workers * 4))
+    if target >= 36:
+        return math.ceil(target / 36) * 36
+    return min(d for d in (1, 2, 3, 4, 6, 9, 12, 18, 36) if d >= target)
+
+
+def rollout(position, games=1296, workers=None, seed=None, chunk=None, quasi_turns=2, max_se=None, min_games=360,
+            policy=heuristic):
+    """
+    Roll out a position, yielding a RolloutResult every time a chunk of games
+    finishes.
+
+    Args:
+        position: engine.Position with current_player set; it is rolled out
+            from before that player's roll.
+        games: total number of games.
+        workers: worker processes, one per core by default.
+        seed: base seed; chunk i of 36 or more games uses seed + i, smaller
+            chunks use seed + their block of 36, so runs are reproducible.
+        chunk: games per task, from chunk_size() by default; a multiple or
+            a divisor of 36 keeps the stratification even.
+        quasi_turns: how many opening turns use stratified dice.
+        max_se: stop early once the equity standard error drops below this
+            (after at least `min_games` games).
+        policy: picklable function(board, player) -> score used to pick plays.
+    """
+    if not position.current_player:
+        raise ValueError("position has no side to move")
+    board = position.board()
+    player = position.current_player
+    seed = random.randrange(1 << 32) if seed is None else seed
+    workers = workers or os.cpu_count()
+    chunk = chunk or chunk_size(games, workers)
+    block = max(chunk, 36)
+    result = RolloutResult()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(rollout_chunk, board, player, min(chunk, games - start), seed + start // block,
+                               quasi_turns, policy, start % block)
+                   for start in range(0, games, chunk)]
+        try:
+            for future in as_completed(futures):
+                result.add(future.result())
+                yield result
+                if max_se is not None and result.games >= min_games and result.equity_se < max_se:
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def rollout_position(position, **kwargs):
+    """Run rollout() to completion and return the final RolloutResult."""
+    result = None
+    for result in rollout(position, **kwargs):
+        pass
+    return result
+
+
+if __name__ == "__main__":
+    import time
+    from engine import Position
+
+    start = time.perf_counter()
+    final = rollout_position(Position(current_player=1), games=int(os.environ.get("ROLLOUT_GAMES", 1296)), seed=1)
+    elapsed = time.perf_counter() - start
+    print(final)
+    print(f"{final.games / elapsed:.1f} games/sec")
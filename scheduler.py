@@ -0,0 +1,103 @@
+"""
+Calls to make after a delay, for the game loop.
+
+Pending calls sit in a min-heap ordered by deadline (on the monotonic
+clock) and then by the order they were scheduled, so run_due() costs one
+look at the top of the heap when nothing is due and O(log n) for each call
+it makes. Cancelling only marks a call; it is dropped when it reaches the
+top.
+
+    scheduler = Scheduler()
+    timer = scheduler.call_later(4, clear_message)
+    ...
+    timer.cancel()
+    ...
+    scheduler.run_due()  # once per frame
+"""
+import heapq
+import itertools
+import time
+
+
+class Timer:
+    """A scheduled call, as returned by Scheduler.call_later()."""
+
+    __slots__ = ("deadline", "func", "cancelled")
+
+    def __init__(self, deadline, func):
+        self.deadline = deadline
+        self.func = func
+        self.cancelled = False
+
+    def cancel(self):
+        """Don't make the call if it hasn't been made yet."""
+        self.cancelled = True
+        self.func = None
+
+
+class Scheduler:
+    """
+    Args:
+        clock: function returning the current time in seconds.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return sum(not entry[2].cancelled for entry in self._heap)
+
+    def call_later(self, delay, func):
+        """Call func() once delay seconds have passed. Returns a Timer."""
+        return self.call_at(self.clock() + delay, func)
+
+    def call_at(self, deadline, func):
+        """Call func() once the clock reaches deadline. Returns a Timer."""
+        timer = Timer(deadline, func)
+        heapq.heappush(self._heap, (deadline, next(self._seq), timer))
+        return timer
+
+    def _drop_cancelled(self):
+        heap = self._heap
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+
+    def next_delay(self):
+        """Seconds until the next call is due (0 if overdue), None if nothing is scheduled."""
+        self._drop_cancelled()
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self.clock())
+
+    def run_due(self):
+        """
+        Make the calls that are due, earliest first. Calls scheduled by them
+        wait for the next run_due() even if already due, so a callback that
+        reschedules itself can't hold up the frame. Returns how many were made.
+        """
+        heap = self._heap
+        if not heap:
+            return 0
+        now = self.clock()
+        if heap[0][0] > now:
+            return 0
+        due = []
+        while heap and heap[0][0] <= now:
+            due.append(heapq.heappop(heap)[2])
+        calls = 0
+        for timer in due:
+            # an earlier call in this batch may have cancelled a later one
+            if not timer.cancelled:
+                func = timer.func
+                timer.cancel()
+                func()
+                calls += 1
+        return calls
+
+    def clear(self):
+        """Cancel everything."""
+        for entry in self._heap:
+            entry[2].cancel()
+        self._heap = []
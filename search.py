@@ -0,0 +1,289 @@
+"""
+Expectiminimax search on top of evaluator.Evaluator.
+
+An n-ply value of a position with a side on roll averages, over the 21
+distinct rolls, the best play the side can make with that roll, each play
+scored at (n - 1) plies from the opponent's point of view; 0 plies is the
+network itself. Every chance node is expanded for all positions of a ply
+at once with batch.batch_plays, and only the best few plays of each roll
+(by their 0-ply score) are searched deeper. Chance-node values are kept in
+a transposition table keyed by Zobrist key and side on roll, so positions
+reached again (by another candidate, another roll or the next move) cost a
+dictionary lookup.
+
+With a deadline, value() checks the clock before every chunk of at most
+CHUNK positions and every ply below it, and gives up with TimeUp; nothing
+half-searched goes into the table.
+
+    search = Search(Evaluator.load("latest.npz"), plies=2)
+    moves, board = search.best_play(board, player, d1, d2)
+"""
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+
+from batch import batch_plays, board_keys
+from engine import CHECKERS, TURN_KEY, board_result, legal_plays
+from evaluator import equity, invert, result_probs
+from transposition import TranspositionTable
+
+ROLLS = np.array([(d1, d2) for d1 in range(1, 7) for d2 in range(d1, 7)])
+WEIGHTS = np.array([1 / 36 if d1 == d2 else 2 / 36 for d1, d2 in ROLLS], dtype=np.float32)
+_TURN_KEY = np.uint64(TURN_KEY)
+# chance nodes expanded at once; bounds how far a search can run past its deadline
+CHUNK = 64
+
+
+class TimeUp(Exception):
+    """The deadline passed in the middle of a search."""
+
+
+def _keys(boards, players):
+    return board_keys(boards) ^ np.where(players == -1, _TURN_KEY, np.uint64(0))
+
+
+def _group_starts(parents):
+    """Index of the first row of each row's group in a parent-sorted array."""
+    return np.searchsorted(parents, parents, side="left")
+
+
+def _finished(boards, movers):
+    """True for every board where the mover has no checkers left."""
+    own = np.where(movers[:, None] == 1, boards[:, :24], -boards[:, :24])
+    return np.maximum(own, 0).sum(1) + np.where(movers == 1, boards[:, 24], boards[:, 25]) == 0
+
+
+def _candidate_value(search, board, player, plies, deadline):
+    """Pool task: see Search._candidate(). None if the deadline passes first."""
+    try:
+        return search._candidate(board, player, plies, deadline)
+    except TimeUp:
+        return None
+
+
+class Search:
+    """
+    Args:
+        evaluator: evaluator.Evaluator used at the leaves.
+        plies: default search depth, 0 to 3.
+        root_k: how many plays of the root roll are searched beyond 0 ply.
+        expand_k: how many plays of each inner roll are searched deeper.
+        margin: plays whose 0-ply equity is more than this below the best
+            play of their roll are never searched deeper.
+        time_budget: default seconds per move, None for no limit.
+        table: TranspositionTable to share between searches.
+        executor: optional thread or process pool spreading the root
+            candidates; a process pool pickles the search, so every task
+            starts from an empty table.
+    """
+
+    def __init__(self, evaluator, plies=2, root_k=8, expand_k=2, margin=0.16, time_budget=None, table=None,
+                 executor=None):
+        self.evaluator = evaluator
+        self.plies = plies
+        self.root_k = root_k
+        self.expand_k = expand_k
+        self.margin = margin
+        self.time_budget = time_budget
+        self.table = TranspositionTable(1 << 18) if table is None else table
+        self.executor = executor
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["table"] = TranspositionTable(self.table.size, self.table.sample)
+        state["executor"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def score(self, boards, movers):
+        """
+        Probabilities for the player who just moved into each board, with
+        exact results for finished games.
+        """
+        # the same position is often reached by several rolls or parents
+        _, first, back = np.unique(_keys(boards, -movers), return_index=True, return_inverse=True)
+        probs = invert(self.evaluator.evaluate(boards[first], -movers[first]))[back]
+        for i in np.flatnonzero(_finished(boards, movers)):
+            board = tuple(int(v) for v in boards[i])
+            probs[i] = result_probs(board_result(board, int(movers[i])))
+        return probs
+
+    def value(self, boards, players, plies, deadline=None):
+        """
+        Probabilities for the side on roll of every board, searched `plies`
+        plies deep.
+
+        Args:
+            boards: (N, 26) boards.
+            players: (N,) side on roll.
+            plies: search depth.
+            deadline: time.perf_counter() value to give up at, raising TimeUp.
+
+        Returns:
+            (N, 5) float32 array.
+        """
+        boards = np.asarray(boards, dtype=np.int8)
+        players = np.broadcast_to(np.asarray(players), (len(boards),))
+        if plies == 0:
+            return self.evaluator.evaluate(boards, players)
+        out = np.empty((len(boards), 5), dtype=np.float32)
+        keys = [int(k) for k in _keys(boards, players)]
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                hit = self.table.get(key, plies)
+                if hit is None:
+                    missing.append(i)
+                else:
+                    out[i] = hit[0]
+        for start in range(0, len(missing), CHUNK):
+            chunk = missing[start:start + CHUNK]
+            values = self._expand(boards[chunk], players[chunk], plies, deadline)
+            out[chunk] = values
+            with self._lock:
+                for i, v in zip(chunk, values):
+                    self.table.put(keys[i], plies, v)
+        return out
+
+    def _expand(self, boards, players, plies, deadline):
+        """Chance node values of boards that are not in the table yet."""
+        if deadline is not None and time.perf_counter() > deadline:
+            raise TimeUp
+        n = len(boards)
+        rolls = len(ROLLS)
+        nodes = np.repeat(boards, rolls, axis=0)
+        movers = np.repeat(players, rolls)
+        successors, parents = batch_plays(nodes, np.tile(ROLLS, (n, 1)), movers)
+        movers = movers[parents]
+        probs = self.score(successors, movers)
+        scores = equity(probs)
+        if plies > 1:
+            # expand only the best few plays of every roll, the rest keep their static score
+            order = np.lexsort((-scores, parents))
+            ranked = parents[order]
+            starts = _group_starts(ranked)
+            best = scores[order][starts]
+            chosen = order[(np.arange(len(order)) - starts < self.expand_k) & (scores[order] >= best - self.margin)]
+            deeper = chosen[~_finished(successors[chosen], movers[chosen])]
+            if len(deeper):
+                probs[deeper] = invert(self.value(successors[deeper], -movers[deeper], plies - 1, deadline))
+            searched = np.zeros(len(scores), dtype=bool)
+            searched[chosen] = True
+            scores = np.where(searched, equity(probs), -math.inf)
+
+        # best play of every roll, then the chance node average over the rolls
+        order = np.lexsort((scores, parents))
+        ranked = parents[order]
+        last = np.ones(len(order), dtype=bool)
+        np.not_equal(ranked[1:], ranked[:-1], out=last[:-1])
+        best = probs[order[last]].reshape(n, rolls, 5)
+        return np.einsum("nrk,r->nk", best, WEIGHTS)
+
+    def _candidate(self, board, player, plies, deadline=None):
+        """Probabilities for `player`, who just moved into `board`, at `plies` plies."""
+        return invert(self.value(board[None], np.array([-player]), plies, deadline))[0]
+
+    def _deepen(self, boards, player, plies, deadline):
+        """Search every board `plies` deep; None if the deadline passes first."""
+        values = np.empty((len(boards), 5), dtype=np.float32)
+        if self.executor is None:
+            try:
+                for i, board in enumerate(boards):
+                    values[i] = self._candidate(board, player, plies, deadline)
+            except TimeUp:
+                return None
+            return values
+        # workers check the deadline themselves, so running tasks stop with it
+        futures = {self.executor.submit(_candidate_value, self, board, player, plies, deadline): i
+                   for i, board in enumerate(boards)}
+        pending = set(futures)
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                for future in pending:
+                    future.cancel()
+                return None
+            for future in done:
+                value = future.result()
+                if value is None:
+                    for future in pending:
+                        future.cancel()
+                    return None
+                values[futures[future]] = value
+        return values
+
+    def rank_plays(self, board, player, d1, d2, plies=None, time_budget=None):
+        """
+        Every play of a roll, best first, as (moves, board, probs, plies)
+        tuples; probs are for `player` and plies is how deep the play was
+        searched. With a time budget the search deepens one ply at a time
+        and keeps the last depth that finished for all candidates.
+        """
+        plies = self.plies if plies is None else plies
+        time_budget = self.time_budget if time_budget is None else time_budget
+        deadline = None if time_budget is None else time.perf_counter() + time_budget
+        plays = legal_plays(board, player, d1, d2)
+        boards = np.array([b for _, b in plays], dtype=np.int8)
+        movers = np.full(len(plays), player)
+        probs = self.score(boards, movers)
+        depth = np.zeros(len(plays), dtype=int)
+        finished = _finished(boards, movers)
+        depth[finished] = CHECKERS
+        if len(plays) > 1 and plies > 0:
+            scores = equity(probs)
+            order = np.argsort(-scores, kind="stable")[:self.root_k]
+            candidates = order[(scores[order] >= scores[order[0]] - 2 * self.margin) & ~finished[order]]
+            for ply in range(1, plies + 1):
+                values = self._deepen(boards[candidates], player, ply, deadline)
+                if values is None:
+                    break
+                probs[candidates] = values
+                depth[candidates] = ply
+                # only plays close to the best at this depth go one ply deeper
+                scores = equity(values)
+                candidates = candidates[scores >= scores.max() - 2 * self.margin]
+        scores = equity(probs)
+        order = sorted(range(len(plays)), key=lambda i: (depth[i], scores[i]), reverse=True)
+        return [(plays[i][0], plays[i][1], probs[i], int(min(depth[i], plies))) for i in order]
+
+    def best_play(self, board, player, d1, d2, plies=None, time_budget=None):
+        """The (moves, board) play the search likes best."""
+        moves, board, _, _ = self.rank_plays(board, player, d1, d2, plies, time_budget)[0]
+        return moves, board
+
+    def evaluate(self, board, player, plies=None):
+        """Probabilities for `player` on roll in `board`, before rolling."""
+        plies = self.plies if plies is None else plies
+        return self.value(np.array([board], dtype=np.int8), np.array([player]), plies)[0]
+
+
+if __name__ == "__main__":
+    import sys
+    from evaluator import Evaluator
+
+    ev = Evaluator.load(sys.argv[1]) if len(sys.argv) > 1 else Evaluator()
+    # a typical middle game position, white to play 3-1
+    board = (-2, 0, 0, 0, 2, 4, 0, 2, 0, 0, 0, -4, 4, 0, 0, -2, -3, -2, -2, 0, 0, 0, 1, 2, 0, 0)
+    for plies in range(4):
+        search = Search(ev, plies=plies)
+        start = time.perf_counter()
+        moves, _, probs, depth = search.rank_plays(board, 1, 3, 1)[0]
+        elapsed = time.perf_counter() - start
+        print(f"{plies}-ply  {moves}  equity {equity(probs):+.3f}  {elapsed:.2f}s  table {search.table.stats()}")
+
+    # a 3-ply search must give up close to its time budget, not after the ply it is in
+    budget = 2.0
+    start = time.perf_counter()
+    moves, _, probs, depth = Search(ev).rank_plays(board, 1, 3, 1, plies=3, time_budget=budget)[0]
+    elapsed = time.perf_counter() - start
+    print(f"budget {budget:.1f}s  {depth}-ply  {moves}  {elapsed:.2f}s")
+    assert elapsed < budget + 0.25, f"search ran {elapsed - budget:.2f}s past its budget"
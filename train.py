@@ -0,0 +1,252 @@
+"""
+Self-play training for evaluator.Evaluator by TD(lambda).
+
+A pool of worker processes plays games against itself with the headless
+rules, each worker reloading the newest weights (latest.npz) whenever they
+change. Finished games come back to the trainer, which turns them into
+lambda-return targets with the current network and appends them to a
+memory-mapped replay buffer. Minibatches for gradient descent are drawn
+from that buffer. Checkpoints hold the weights plus the trainer and buffer
+state, so a run can be resumed from the newest of them; older ones only
+have their weights left, since later games have gone into the buffer.
+
+    python train.py --dir checkpoints --games 200000 --workers 32
+"""
+import argparse
+import glob
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from dicesource import RandomDice
+from engine import START, board_result
+from evaluator import OUTPUTS, Evaluator, encode, equity, invert, result_probs
+
+_worker_cache = {}
+
+
+def _latest_evaluator(path):
+    """The evaluator saved at path, reloaded only when the file changes."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _worker_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, Evaluator.load(path))
+        _worker_cache[path] = cached
+    return cached[1]
+
+
+def play_games(weights_path, games, seed, epsilon=0.0):
+    """
+    Worker task: play `games` self-play games with the latest weights.
+
+    Returns a list of (boards, players, points) per game: every position
+    reached after a play that did not end the game, the side on roll in it,
+    and the points won by the side on roll in the last of them.
+    """
+    ev = _latest_evaluator(weights_path)
+    dice = RandomDice(seed)
+    rng = dice.random
+    results = []
+    for _ in range(games):
+        board = START + (0, 0)
+        d1, d2 = dice.roll()
+        while d1 == d2:
+            d1, d2 = dice.roll()
+        player = 1 if d1 < d2 else -1
+        boards, players = [], []
+        while True:
+            plays, probs = ev.evaluate_plays(board, player, d1, d2)
+            if epsilon and rng.random() < epsilon:
+                board = rng.choice(plays)[1]
+            else:
+                board = plays[int(np.argmax(equity(probs)))][1]
+            points = board_result(board, player)
+            if points:
+                break
+            player = -player
+            boards.append(board)
+            players.append(player)
+            d1, d2 = dice.roll()
+        # the side on roll in the last recorded position is the one that won
+        results.append((np.array(boards, dtype=np.int8).reshape(-1, 26), np.array(players, dtype=np.int8), points))
+    return results
+
+
+def lambda_returns(ev, boards, players, points, lam):
+    """
+    TD(lambda) targets for one game, each from the side on roll's view.
+    Consecutive positions alternate sides, so the next estimate and target
+    are inverted before being blended.
+    """
+    if not len(boards):
+        return np.zeros((0, OUTPUTS), dtype=np.float32)
+    values = ev.evaluate(boards, players)
+    targets = np.empty_like(values)
+    targets[-1] = result_probs(points)
+    for t in range(len(boards) - 2, -1, -1):
+        following = invert(np.stack([values[t + 1], targets[t + 1]]))
+        targets[t] = (1 - lam) * following[0] + lam * following[1]
+    return targets
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of (board, side on roll, target) rows kept in np.memmap
+    files, so it can be far larger than RAM and survives restarts.
+    """
+
+    def __init__(self, directory, capacity, head=0, size=0):
+        self.capacity = capacity
+        self.head = head
+        self.size = size
+        mode = "r+" if os.path.exists(os.path.join(directory, "boards.dat")) else "w+"
+        self.boards = np.memmap(os.path.join(directory, "boards.dat"), np.int8, mode, shape=(capacity, 26))
+        self.players = np.memmap(os.path.join(directory, "players.dat"), np.int8, mode, shape=(capacity,))
+        self.targets = np.memmap(os.path.join(directory, "targets.dat"), np.float32, mode, shape=(capacity, OUTPUTS))
+
+    def append(self, boards, players, targets):
+        for start in range(0, len(boards), self.capacity):
+            chunk = slice(start, start + self.capacity)
+            n = len(boards[chunk])
+            index = (self.head + np.arange(n)) % self.capacity
+            self.boards[index] = boards[chunk]
+            self.players[index] = players[chunk]
+            self.targets[index] = targets[chunk]
+            self.head = (self.head + n) % self.capacity
+            self.size = min(self.size + n, self.capacity)
+
+    def sample(self, rng, batch):
+        index = np.sort(rng.integers(0, self.size, batch))
+        return self.boards[index], self.players[index], self.targets[index]
+
+    def flush(self):
+        self.boards.flush()
+        self.players.flush()
+        self.targets.flush()
+
+
+def sgd_step(ev, boards, players, targets, lr):
+    """One minibatch gradient step on squared error; returns the loss."""
+    inputs = encode(boards, players)
+    hidden, out = ev.forward(inputs)
+    error = out - targets
+    delta_out = error * out * (1 - out)
+    delta_hidden = (delta_out @ ev.W2.T) * hidden * (1 - hidden)
+    scale = lr / len(boards)
+    ev.W2 -= scale * (hidden.T @ delta_out)
+    ev.b2 -= scale * delta_out.sum(axis=0)
+    ev.W1 -= scale * (inputs.T @ delta_hidden)
+    ev.b1 -= scale * delta_hidden.sum(axis=0)
+    return float((error ** 2).mean())
+
+
+def _checkpoints(directory):
+    found = []
+    for path in glob.glob(os.path.join(directory, "checkpoint-*.npz")):
+        match = re.search(r"checkpoint-(\d+)\.npz$", path)
+        if match:
+            found.append((int(match.group(1)), path))
+    return [path for _, path in sorted(found)]
+
+
+def _save(path, ev, state=None):
+    """Write weights (and trainer state) atomically so workers never see half a file."""
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **ev.weights(), **{k: np.asarray(v) for k, v in (state or {}).items()})
+    os.replace(tmp, path)
+
+
+def train(directory, games, workers=None, games_per_task=8, hidden=80, lam=0.7, lr=0.1, batch=256,
+          replay_ratio=1.0, capacity=1 << 21, checkpoint_every=1000, report_every=10.0, resume=None, seed=0, epsilon=0.0):
+    """
+    Train until `games` games have been played in total (including those of
+    a resumed run). `resume` is a checkpoint path, or "latest" for the
+    newest checkpoint in `directory`; it has to be the newest one, because
+    the replay buffer there already holds the games played after any other.
+    """
+    os.makedirs(directory, exist_ok=True)
+    found = _checkpoints(directory)
+    if resume == "latest":
+        resume = found[-1] if found else None
+    elif resume and (not found or not os.path.samefile(resume, found[-1])):
+        newest = found[-1] if found else f"none in {directory}"
+        raise ValueError(f"can only resume from the newest checkpoint ({newest}), not {resume}: "
+                         "the replay buffer holds games played after it")
+    state = {"games": 0, "positions": 0, "updates": 0, "head": 0, "size": 0, "seed": seed, "capacity": capacity}
+    if resume:
+        with np.load(resume) as saved:
+            ev = Evaluator({k: saved[k] for k in ("W1", "b1", "W2", "b2")})
+            state.update({k: int(saved[k]) for k in state if k in saved})
+        print(f"Resumed from {resume} at {state['games']} games")
+    else:
+        ev = Evaluator(hidden=hidden, seed=seed)
+    buffer = ReplayBuffer(directory, state["capacity"], state["head"], state["size"])
+    latest = os.path.join(directory, "latest.npz")
+    _save(latest, ev)
+
+    rng = np.random.default_rng(state["seed"] + state["games"])
+    task_seed = state["seed"] * 1_000_003 + state["games"]
+    start_games, start_positions = state["games"], state["positions"]
+    started = last_report = time.perf_counter()
+    last_checkpoint = state["games"]
+    losses = []
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        queued = state["games"]
+        while state["games"] < games:
+            while len(pending) < 2 * workers and queued < games:
+                n = min(games_per_task, games - queued)
+                pending.add(pool.submit(play_games, latest, n, task_seed, epsilon))
+                task_seed += 1
+                queued += n
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            added = 0
+            for future in done:
+                for boards, players, points in future.result():
+                    buffer.append(boards, players, lambda_returns(ev, boards, players, points, lam))
+                    state["games"] += 1
+                    added += len(boards)
+            state["positions"] += added
+            for _ in range(max(1, int(added * replay_ratio / batch))):
+                losses.append(sgd_step(ev, *buffer.sample(rng, batch), lr))
+                state["updates"] += 1
+            _save(latest, ev)
+            state["head"], state["size"] = buffer.head, buffer.size
+
+            now = time.perf_counter()
+            if now - last_report >= report_every or state["games"] >= games:
+                elapsed = now - started
+                print(f"games {state['games']}  positions {state['positions']}  "
+                      f"{(state['games'] - start_games) / elapsed:.1f} games/s  "
+                      f"{(state['positions'] - start_positions) / elapsed:.0f} positions/s  "
+                      f"loss {np.mean(losses[-100:]):.5f}")
+                last_report = now
+            if state["games"] - last_checkpoint >= checkpoint_every or state["games"] >= games:
+                buffer.flush()
+                _save(os.path.join(directory, f"checkpoint-{state['games']}.npz"), ev, state)
+                last_checkpoint = state["games"]
+    return ev
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the position evaluator by self-play TD(lambda).")
+    parser.add_argument("--dir", default="checkpoints", help="checkpoint and replay buffer directory")
+    parser.add_argument("--games", type=int, default=100000, help="total games to train for")
+    parser.add_argument("--workers", type=int, default=None, help="self-play processes (default: one per core)")
+    parser.add_argument("--hidden", type=int, default=80)
+    parser.add_argument("--lam", type=float, default=0.7)
+    parser.add_argument("--lr", type=float, default=0.1)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--capacity", type=int, default=1 << 21, help="replay buffer positions")
+    parser.add_argument("--checkpoint-every", type=int, default=1000)
+    parser.add_argument("--resume", default=None, help='checkpoint to resume from, or "latest"')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--epsilon", type=float, default=0.0, help="chance of a random play during self-play")
+    args = parser.parse_args()
+    train(args.dir, args.games, args.workers, hidden=args.hidden, lam=args.lam, lr=args.lr, batch=args.batch,
+          capacity=args.capacity, checkpoint_every=args.checkpoint_every, resume=args.resume, seed=args.seed,
+          epsilon=args.epsilon)
@@ -0,0 +1,74 @@
+"""
+Fixed-size transposition table keyed by Zobrist keys (engine.Position.key,
+hash(position) or engine.board_key()).
+"""
+from collections import OrderedDict
+from itertools import islice
+
+
+class TranspositionTable:
+    """
+    Caches evaluations and best plays for positions already searched.
+
+    Entries are (depth, value, best) tuples. A lookup only hits when the
+    stored search was at least as deep as the one requested. When the table
+    is full the shallowest of the `sample` least recently used entries is
+    evicted, so deep results survive a flood of cheap ones while stale
+    entries still age out.
+
+    Args:
+        size: maximum number of entries.
+        sample: how many LRU entries are considered for eviction.
+    """
+
+    def __init__(self, size=1 << 16, sample=8):
+        self.size = size
+        self.sample = sample
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, depth=0):
+        """Return (value, best) stored for key at depth >= `depth`, or None."""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key, depth, value, best=None):
+        entries = self.entries
+        entry = entries.get(key)
+        if entry is not None:
+            if entry[0] <= depth:
+                entries[key] = (depth, value, best)
+            entries.move_to_end(key)
+            return
+        if len(entries) >= self.size:
+            victim = min(islice(entries.items(), self.sample), key=lambda item: item[1][0])[0]
+            del entries[victim]
+            self.evictions += 1
+        entries[key] = (depth, value, best)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }